@@ -24,11 +24,22 @@ XUartLite UartInstance;
 #define SYSRANGE_START      0x00
 #define RESULT_RANGE_VAL    0x1E
 
+// 1: send each reading as a 7-byte binary frame instead of the ~17-byte
+// "distance: N mm\r\n" text line, so more readings fit through the link.
+// Frame: 0xA5 sync, u16 seq, u16 distance (0xFFFF = ERROR), u8 status,
+// CRC-8 (poly 0x07) of the 5 bytes after the sync; u16 fields little-endian.
+// The host (serial_ingest.py) detects either format on its own.
+#define UART_BINARY_FRAMES  0
+#define FRAME_SYNC          0xA5
+#define FRAME_STATUS_ERROR  0x01
+
 
 // Function declarations...
 int uart_init();
 void uart_send_string(const char* str);
 void uart_send_distance(u16 distance);
+void uart_send_frame(u16 seq, u16 distance);
+u8 crc8(const u8 *data, int length);
 int vl53l0x_start_ranging();
 u16 vl53l0x_read_distance();
 void blink_led(XGpio *GpioInst, u32 led_mask, int delay_ms);
@@ -57,6 +68,30 @@ void uart_send_distance(u16 distance) {
     uart_send_string(buffer);
 }
 
+u8 crc8(const u8 *data, int length) {
+    u8 crc = 0;
+    for (int i = 0; i < length; i++) {
+        crc ^= data[i];
+        for (int bit = 0; bit < 8; bit++) {
+            crc = (crc & 0x80) ? (u8)((crc << 1) ^ 0x07) : (u8)(crc << 1);
+        }
+    }
+    return crc;
+}
+
+void uart_send_frame(u16 seq, u16 distance) {
+    u8 frame[7];
+    frame[0] = FRAME_SYNC;
+    frame[1] = seq & 0xFF;
+    frame[2] = seq >> 8;
+    frame[3] = distance & 0xFF;
+    frame[4] = distance >> 8;
+    frame[5] = (distance == 0xFFFF) ? FRAME_STATUS_ERROR : 0;
+    frame[6] = crc8(&frame[1], 5);
+    XUartLite_Send(&UartInstance, frame, sizeof(frame));
+    while (XUartLite_IsSending(&UartInstance));
+}
+
 int vl53l0x_start_ranging() {
     u8 cmd[2] = {SYSRANGE_START, 0x01};
     int Status = XIic_Send(IicInstance.BaseAddress, VL53L0X_I2C_ADDR, cmd, 2, XIIC_STOP);
@@ -84,6 +119,7 @@ void blink_led(XGpio *GpioInst, u32 led_mask, int delay_ms) {
 int main() {
     int Status;
     u16 distance;
+    u16 seq = 0;
     XIic_Config *IicConfig;
     XGpio_Config *Gpio0_Config, *Gpio1_Config;
 
@@ -107,7 +143,11 @@ int main() {
         vl53l0x_start_ranging();
         usleep(50000);
         distance = vl53l0x_read_distance();
+#if UART_BINARY_FRAMES
+        uart_send_frame(seq++, distance);
+#else
         uart_send_distance(distance);
+#endif
 
         
         if (distance >20 && distance < 150) {
@@ -0,0 +1,494 @@
+import asyncio
+import base64
+import hashlib
+import json
+import time
+from collections import deque
+from urllib.parse import parse_qs, urlsplit
+
+import pipeline_metrics
+from stream_broadcast import KEEPALIVE_INTERVAL, RECONNECT_DELAY_MS, SUBSCRIBER_QUEUE_SIZE, drop_frame
+from stream_encoding import WEBSOCKET_FORMATS, WS_CLOSE, WS_PING, WS_PONG, WS_TEXT, websocket_frame
+
+# --- Asyncio Server ---
+# Alternative to Flask's thread-per-request server for many concurrent
+# dashboards. Every connection is a coroutine on one event loop, so an idle
+# /stream subscriber costs a few KB (reader, writer, a small deque) instead of
+# an OS thread. Serial ports are read on the same loop (SensorChannel.run_async).
+# Only the dashboard routes are served: /, /static/..., /stream, /zones, /ws,
+# /metrics and whatever JSON routes the dashboard script passes in (/sensors,
+# /history, the toggles).
+# /ws (WebSocket, RFC 6455) exists only here; Flask would need an extension.
+SERVER_BACKLOG = 1024  # pending connections the listening socket queues
+MAX_HEADER_BYTES = 16384  # longest request head accepted
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+WS_KEEPALIVE = websocket_frame(b"", WS_PING)
+
+STATUS_TEXT = {200: "OK", 304: "Not Modified", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 500: "Internal Server Error"}
+
+
+class Subscriber:
+    """One streaming client: frames waiting to be written and a wake-up event.
+
+    ``accept(seq, meta)``, if set, decides per frame whether the client wants
+    it, before the frame takes a place in the buffer.
+    """
+
+    def __init__(self, queue_size=SUBSCRIBER_QUEUE_SIZE, accept=None):
+        # A full deque makes room like Broadcaster's thread queues: unretained frames go first
+        self.frames = deque()
+        self.queue_size = queue_size
+        self.ready = asyncio.Event()
+        self.closed = False
+        self.accept = accept
+        self.dropped = 0
+
+    def push(self, seq, frame, retain=True):
+        if len(self.frames) >= self.queue_size:
+            self.dropped += 1
+            drop_frame(self.frames)
+        self.frames.append((seq, frame, retain))
+        self.ready.set()
+
+
+class Subscription:
+    """What one WebSocket client asked for, applied by the server before sending.
+
+    Options (query string on /ws, or a JSON text message at any time):
+    ``sensors`` (list or comma-separated; default all), ``format`` (json,
+    binary or msgpack), ``zones_only`` (only readings whose zone differs from
+    the last one sent for that sensor), ``errors_only`` and ``decimate`` (every
+    Nth remaining reading per sensor). Status and stats messages always pass.
+    """
+
+    def __init__(self, sensors):
+        self.all_sensors = sensors
+        self.sensors = list(sensors)
+        self.format = 'json'
+        self.zones_only = False
+        self.errors_only = False
+        self.decimate = 1
+        self.zones = {}
+        self.counts = {}
+
+    def update(self, options):
+        """Apply the options present in ``options``; raises LookupError/ValueError when invalid."""
+        sensors, encoding = self.sensors, options.get('format', self.format)
+        if 'sensors' in options:
+            sensors = options['sensors']
+            if isinstance(sensors, str):
+                sensors = [sensor for sensor in sensors.split(',') if sensor]
+            unknown = [sensor for sensor in sensors if sensor not in self.all_sensors]
+            if unknown:
+                raise LookupError(f"unknown sensor {', '.join(unknown)}")
+        if encoding not in WEBSOCKET_FORMATS or encoding not in next(iter(self.all_sensors.values())).encoded:
+            raise ValueError(f"unsupported format {encoding}")
+        if encoding == 'binary' and len(sensors) > 1:
+            raise ValueError("binary frames carry no sensor ID; use json or msgpack for several sensors")
+        decimate = int(options.get('decimate', self.decimate))
+        if decimate < 1:
+            raise ValueError("decimate must be at least 1")
+        self.sensors, self.format, self.decimate = list(sensors), encoding, decimate
+        self.zones_only = flag(options.get('zones_only', self.zones_only))
+        self.errors_only = flag(options.get('errors_only', self.errors_only))
+        self.zones.clear()
+        self.counts.clear()
+
+    def describe(self):
+        return {"sensors": self.sensors, "format": self.format, "zones_only": self.zones_only,
+                "errors_only": self.errors_only, "decimate": self.decimate}
+
+    def broadcasters(self):
+        return [self.all_sensors[sensor].encoded[self.format].broadcaster for sensor in self.sensors]
+
+    def accept(self, seq, meta):
+        if meta is None:
+            return True
+        sensor_id, record = meta
+        if self.errors_only and not record.error:
+            return False
+        if self.zones_only:
+            if sensor_id in self.zones and self.zones[sensor_id] == record.zone:
+                return False
+            self.zones[sensor_id] = record.zone
+        if self.decimate > 1:
+            count = self.counts.get(sensor_id, 0)
+            self.counts[sensor_id] = count + 1
+            if count % self.decimate:
+                return False
+        return True
+
+
+def flag(value):
+    if isinstance(value, str):
+        return value.lower() in ('1', 'true', 'yes', 'on')
+    return bool(value)
+
+
+class LoopFanout:
+    """Delivers a Broadcaster's frames to every asyncio subscriber.
+
+    The broadcaster calls ``listener`` from whichever thread publishes; that
+    costs one ``call_soon_threadsafe`` per frame however many clients are
+    connected. On the loop the frame is encoded to bytes once and appended to
+    the deque of each subscriber that accepts it.
+
+    The listener is registered only while there are subscribers, so an
+    encoding nobody follows any more goes inactive (EncodedStream.active) and
+    stops being produced.
+    """
+
+    def __init__(self, loop, broadcaster, queue_size=SUBSCRIBER_QUEUE_SIZE):
+        self.loop = loop
+        self.broadcaster = broadcaster
+        self.queue_size = queue_size
+        self.subscribers = set()
+        # Bound once: remove_listener() matches by identity
+        self.listen = self.listener
+
+    def close(self):
+        self.subscribers.clear()
+        self.broadcaster.remove_listener(self.listen)
+
+    def listener(self, seq, frame, retain, meta):
+        try:
+            self.loop.call_soon_threadsafe(self.dispatch, seq, frame, retain, meta)
+        except RuntimeError:
+            pass  # loop already closed during shutdown
+
+    def dispatch(self, seq, frame, retain, meta):
+        # SSE frames are text; WebSocket frames arrive already framed as bytes
+        if not isinstance(frame, bytes):
+            frame = frame.encode('utf-8')
+        for subscriber in self.subscribers:
+            if subscriber.accept is None or subscriber.accept(seq, meta):
+                subscriber.push(seq, frame, retain)
+
+    def subscribe(self, subscriber=None):
+        """Add ``subscriber`` (one client may listen to several broadcasters) or a new one."""
+        if subscriber is None:
+            subscriber = Subscriber(self.queue_size)
+        if not self.subscribers:
+            self.broadcaster.add_listener(self.listen)
+        self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        if subscriber in self.subscribers:
+            self.subscribers.remove(subscriber)
+            if not self.subscribers:
+                self.broadcaster.remove_listener(self.listen)
+
+
+class AsyncDashboardServer:
+    """HTTP/1.1 server for the dashboard routes, one coroutine per connection.
+
+    ``pages`` maps a sensor ID to its dashboard page and ``assets`` a path to a
+    stylesheet or script, all StaticAsset objects (static_assets.py). ``get_routes`` map
+    a path to a function of the query arguments (a dict) and ``post_routes`` to
+    a function of no arguments; both return a JSON-serialisable value. A
+    LookupError from a handler becomes a 404 and a ValueError a 400.
+    """
+
+    def __init__(self, sensors, zone_stream, pages, assets=None, get_routes=None, post_routes=None):
+        self.sensors = sensors
+        self.zone_stream = zone_stream
+        self.pages = pages
+        self.assets = assets or {}
+        self.get_routes = get_routes or {}
+        self.post_routes = post_routes or {}
+        self.fanouts = {}
+
+    def fanout(self, broadcaster):
+        # Created lazily on the running loop, one per broadcaster
+        fanout = self.fanouts.get(id(broadcaster))
+        if fanout is None:
+            fanout = LoopFanout(asyncio.get_running_loop(), broadcaster)
+            self.fanouts[id(broadcaster)] = fanout
+        return fanout
+
+    def subscriber_count(self):
+        return [({"server": "asyncio"}, sum(len(fanout.subscribers) for fanout in self.fanouts.values()))]
+
+    async def serve(self, host, port):
+        pipeline_metrics.register(pipeline_metrics.Sampled(
+            'vl53_stream_connections', "Streaming subscriptions currently open", self.subscriber_count))
+        for channel in self.sensors.values():
+            asyncio.get_running_loop().create_task(channel.run_async())
+        server = await asyncio.start_server(self.handle, host, port, backlog=SERVER_BACKLOG, limit=MAX_HEADER_BYTES)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for fanout in self.fanouts.values():
+                fanout.close()
+
+    def run(self, host, port):
+        asyncio.run(self.serve(host, port))
+
+    # --- Requests ---
+    async def handle(self, reader, writer):
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            writer.close()
+            return
+        try:
+            request_line, *header_lines = head.decode('latin-1').split("\r\n")
+            method, target, _ = request_line.split(" ", 2)
+            headers = {}
+            for line in header_lines:
+                name, _, value = line.partition(":")
+                if value:
+                    headers[name.strip().lower()] = value.strip()
+            if int(headers.get('content-length', 0) or 0) > 0:
+                await reader.readexactly(int(headers['content-length']))
+            url = urlsplit(target)
+            args = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            await self.route(reader, writer, method, url.path, args, headers)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass  # client went away
+        except ValueError:
+            await self.respond(writer, 400, "text/plain", b"Bad Request")
+        except Exception as e:
+            print(f"[ERROR] Request failed: {e}")
+            try:
+                await self.respond(writer, 500, "text/plain", str(e).encode('utf-8'))
+            except ConnectionError:
+                pass
+        finally:
+            writer.close()
+
+    async def route(self, reader, writer, method, path, args, headers):
+        # EventSource resends the id of the last frame it saw when it reconnects
+        last_event_id = headers.get('last-event-id') or args.get('last_event_id')
+        if method == "POST" and path in self.post_routes:
+            await self.respond_json(writer, *self.call(self.post_routes[path]))
+        elif method != "GET" and (path in ("/", "/stream", "/zones", "/ws", "/metrics")
+                                  or path in self.get_routes or path in self.assets):
+            await self.respond(writer, 405, "text/plain", b"Method Not Allowed")
+        elif path == "/":
+            channel = self.channel(args)
+            if channel is None:
+                channel = next(iter(self.sensors.values()))
+            await self.respond_asset(writer, self.pages[channel.sensor_id], headers, args)
+        elif path in self.assets:
+            await self.respond_asset(writer, self.assets[path], headers, args)
+        elif path == "/metrics":
+            await self.respond(writer, 200, pipeline_metrics.CONTENT_TYPE, pipeline_metrics.render().encode('utf-8'))
+        elif path in self.get_routes:
+            # Queries (a search over every distinct line, a history page) run on a worker thread,
+            # so the event loop keeps serving streams meanwhile
+            value, status = await asyncio.get_running_loop().run_in_executor(
+                None, self.call, self.get_routes[path], args)
+            await self.respond_json(writer, value, status)
+        elif path == "/stream":
+            channel = self.channel(args)
+            encoding = args.get('format', 'json')
+            if channel is None:
+                await self.respond_json(writer, {"error": f"unknown sensor {args.get('sensor')}"}, 404)
+            elif encoding == 'json':
+                await self.stream(writer, channel.broadcaster, channel.replay_readings, last_event_id)
+            elif encoding == 'compact':
+                await self.stream(writer, channel.encoded[encoding].broadcaster, channel.replay_compact, last_event_id)
+            else:
+                await self.respond_json(writer, {"error": f"unsupported format {encoding} on /stream"}, 400)
+        elif path == "/ws":
+            await self.websocket(reader, writer, headers, args)
+        elif path == "/zones":
+            await self.stream(writer, self.zone_stream.broadcaster, self.zone_stream.replay, last_event_id)
+        else:
+            await self.respond(writer, 404, "text/plain", b"Not Found")
+
+    def channel(self, args):
+        sensor_id = args.get('sensor')
+        if sensor_id is None:
+            return next(iter(self.sensors.values()))
+        return self.sensors.get(sensor_id)
+
+    def call(self, handler, *args):
+        """Run a JSON route handler; returns ``(value, status)``."""
+        try:
+            return handler(*args), 200
+        except LookupError as e:
+            return {"error": str(e)}, 404
+        except ValueError as e:
+            return {"error": f"bad query: {e}"}, 400
+        except Exception as e:
+            print(f"[ERROR] {handler.__name__} failed: {e}")
+            return {"error": str(e)}, 500
+
+    async def respond(self, writer, status, content_type, body):
+        writer.write(f"HTTP/1.1 {status} {STATUS_TEXT[status]}\r\n"
+                     f"Content-Type: {content_type}\r\n"
+                     f"Content-Length: {len(body)}\r\n"
+                     f"Connection: close\r\n\r\n".encode('latin-1') + body)
+        await writer.drain()
+
+    async def respond_asset(self, writer, asset, headers, args):
+        status, response_headers, body = asset.response(headers.get('accept-encoding'),
+                                                        headers.get('if-none-match'), args.get('v'))
+        if status != 304:
+            response_headers["Content-Length"] = len(body)
+        writer.write(f"HTTP/1.1 {status} {STATUS_TEXT[status]}\r\n".encode('latin-1')
+                     + "".join(f"{name}: {value}\r\n" for name, value in response_headers.items()).encode('latin-1')
+                     + b"Connection: close\r\n\r\n" + body)
+        await writer.drain()
+
+    async def respond_json(self, writer, value, status=200):
+        await self.respond(writer, status, "application/json", json.dumps(value).encode('utf-8'))
+
+    # --- Streaming ---
+    async def stream(self, writer, broadcaster, replay, last_event_id):
+        """Async counterpart of Broadcaster.stream(): replay or latest frame, then live frames."""
+        fanout = self.fanout(broadcaster)
+        # Subscribe before replaying so nothing published meanwhile is lost
+        subscriber = fanout.subscribe()
+        try:
+            writer.write(b"HTTP/1.1 200 OK\r\n"
+                         b"Content-Type: text/event-stream\r\n"
+                         b"Cache-Control: no-cache\r\n"
+                         b"Access-Control-Allow-Origin: *\r\n"
+                         b"Connection: close\r\n\r\n"
+                         b"retry: %d\n\n" % RECONNECT_DELAY_MS)
+            resume_seq = broadcaster.parse_event_id(last_event_id)
+            if resume_seq is not None and replay is not None:
+                # Up to REPLAY_LIMIT readings are re-encoded, on a worker thread like the queries
+                frames = await asyncio.get_running_loop().run_in_executor(
+                    None, lambda: list(replay(resume_seq + 1)))
+                for seq, frame in frames:
+                    resume_seq = seq
+                    writer.write(frame.encode('utf-8'))
+                    await writer.drain()
+            else:
+                # Frames queued meanwhile that the latest frame already covers are skipped
+                resume_seq = None
+                if broadcaster.latest is not None:
+                    resume_seq, frame = broadcaster.latest
+                    writer.write(frame.encode('utf-8'))
+            await writer.drain()
+            # Comment line keeps proxies open and lets the server notice a gone client
+            await self.pump(writer, subscriber, resume_seq, b": keepalive\n\n")
+        finally:
+            fanout.unsubscribe(subscriber)
+
+    async def pump(self, writer, subscriber, resume_seq, keepalive):
+        """Write the subscriber's frames as they arrive until the client goes away."""
+        send_time = pipeline_metrics.stage('client_send')
+        while not subscriber.closed:
+            try:
+                await asyncio.wait_for(subscriber.ready.wait(), KEEPALIVE_INTERVAL)
+            except asyncio.TimeoutError:
+                writer.write(keepalive)
+                await writer.drain()
+                continue
+            subscriber.ready.clear()
+            frames = subscriber.frames
+            batch = []
+            while frames:
+                seq, frame, _ = frames.popleft()
+                if seq is not None and resume_seq is not None and seq <= resume_seq:
+                    continue
+                batch.append(frame)
+            # Everything that arrived since the last wake-up goes out in one send
+            started = time.perf_counter()
+            writer.write(b"".join(batch))
+            await writer.drain()
+            send_time.time(started)
+
+    # --- WebSocket ---
+    async def websocket(self, reader, writer, headers, args):
+        """Upgrade to a WebSocket and send the frames the client's Subscription accepts."""
+        key = headers.get('sec-websocket-key')
+        if headers.get('upgrade', '').lower() != 'websocket' or not key:
+            await self.respond(writer, 400, "text/plain", b"Expected a WebSocket upgrade")
+            return
+        subscription = Subscription(self.sensors)
+        options = dict(args)
+        if 'sensor' in options:
+            options.setdefault('sensors', options.pop('sensor'))
+        value, status = self.call(subscription.update, options)
+        if status != 200:
+            await self.respond_json(writer, value, status)
+            return
+        accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode('latin-1')).digest()).decode('latin-1')
+        writer.write(f"HTTP/1.1 101 Switching Protocols\r\n"
+                     f"Upgrade: websocket\r\n"
+                     f"Connection: Upgrade\r\n"
+                     f"Sec-WebSocket-Accept: {accept}\r\n\r\n".encode('latin-1'))
+
+        # One buffer for the client however many sensors it follows
+        subscriber = Subscriber(accept=subscription.accept)
+        fanouts = {}
+
+        def resubscribe():
+            wanted = {id(broadcaster): broadcaster for broadcaster in subscription.broadcasters()}
+            for key in [key for key in fanouts if key not in wanted]:
+                fanouts.pop(key).unsubscribe(subscriber)
+            for key, broadcaster in wanted.items():
+                if key not in fanouts:
+                    fanouts[key] = self.fanout(broadcaster)
+                    fanouts[key].subscribe(subscriber)
+                    # Current status and stats of a newly followed sensor
+                    if broadcaster.latest is not None:
+                        subscriber.push(None, broadcaster.latest[1])
+            message = {"subscribed": subscription.describe()}
+            subscriber.push(None, websocket_frame(json.dumps(message).encode('utf-8'), WS_TEXT))
+
+        def on_text(payload):
+            try:
+                options = json.loads(payload)
+                if not isinstance(options, dict):
+                    raise ValueError("expected a JSON object")
+                subscription.update(options)
+            except (LookupError, ValueError) as e:
+                error = json.dumps({"error": str(e)}).encode('utf-8')
+                subscriber.push(None, websocket_frame(error, WS_TEXT))
+                return
+            resubscribe()
+
+        resubscribe()
+        client = asyncio.get_running_loop().create_task(self.read_websocket(reader, writer, subscriber, on_text))
+        try:
+            # Sequence numbers differ per sensor, so nothing is skipped by seq here
+            await self.pump(writer, subscriber, None, WS_KEEPALIVE)
+        finally:
+            client.cancel()
+            for fanout in fanouts.values():
+                fanout.unsubscribe(subscriber)
+
+    async def read_websocket(self, reader, writer, subscriber, on_text):
+        """Handle client messages, pings and the close handshake; marks the subscriber closed when the client leaves."""
+        try:
+            while True:
+                opcode, payload = await read_websocket_frame(reader)
+                if opcode == WS_CLOSE:
+                    writer.write(websocket_frame(payload[:2], WS_CLOSE))
+                    break
+                if opcode == WS_PING:
+                    writer.write(websocket_frame(payload, WS_PONG))
+                elif opcode == WS_TEXT:
+                    on_text(payload)
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            subscriber.closed = True
+            subscriber.ready.set()
+
+
+async def read_websocket_frame(reader):
+    """Read one client frame; returns ``(opcode, unmasked payload)``."""
+    head = await reader.readexactly(2)
+    length = head[1] & 0x7F
+    if length == 126:
+        length = int.from_bytes(await reader.readexactly(2), 'big')
+    elif length == 127:
+        length = int.from_bytes(await reader.readexactly(8), 'big')
+    if length > MAX_HEADER_BYTES:
+        raise ValueError("WebSocket message too large")
+    mask = await reader.readexactly(4) if head[1] & 0x80 else None
+    payload = await reader.readexactly(length)
+    if mask is not None:
+        payload = bytes(byte ^ mask[index & 3] for index, byte in enumerate(payload))
+    return head[0] & 0x0F, payload
@@ -0,0 +1,226 @@
+import argparse
+import json
+import os
+import platform
+import re
+import selectors
+import socket
+import subprocess
+import sys
+import threading
+import time
+import tty
+from datetime import datetime
+
+# End-to-end latency benchmark: serial byte -> server -> SSE client.
+#
+# A pty stands in for the Arty board. The server under test opens the pty's
+# device path as its SERIAL_PORT (through pyserial, exactly like a COM port),
+# this process writes firmware lines into the other end at a fixed rate and N
+# SSE clients measure when each reading shows up on /stream. Each reading's
+# distance value is unique within a run, so the client knows which write it
+# belongs to. The server is restarted for every configuration, and readings are
+# only sent once every client has seen it report the pty as connected. A run
+# that cannot measure (no connection, nothing delivered) exits with status 1
+# and writes no --output.
+# Needs a POSIX pty, so run it on Linux/macOS; server CPU is read from /proc.
+#
+#   python bench_latency.py --rates 20,200,1000 --clients 1,10,30 --output bench.json
+
+DEFAULT_SERVER = 'web_page_for_VL53L0x_Uart.py'
+MAX_READINGS = 60000  # distances 1..60000 identify readings uniquely
+DISTANCE_PATTERN = re.compile(rb'"distance_mm": (\d+)')
+CONNECTED_PATTERN = re.compile(rb'"status": "Connected"')
+SERIAL_CONNECT_TIMEOUT = 10.0  # seconds for the server to open the pty (it retries every 3 s)
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def process_cpu_seconds(pid):
+    """User + system CPU seconds used by ``pid`` (Linux /proc), or None."""
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def wait_for_port(port, timeout=15.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+            return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+class StreamClients:
+    """N SSE subscribers serviced by one selector thread, timestamping each reading."""
+
+    def __init__(self, port, count, send_times):
+        self.send_times = send_times
+        self.latencies = []
+        self.received = [0] * count
+        self.connected = [False] * count
+        self.serial_connected = [False] * count
+        self.selector = selectors.DefaultSelector()
+        self.running = True
+        for index in range(count):
+            sock = socket.create_connection(('127.0.0.1', port))
+            sock.sendall(b"GET /stream HTTP/1.1\r\nHost: localhost\r\nAccept: text/event-stream\r\n\r\n")
+            sock.setblocking(False)
+            self.selector.register(sock, selectors.EVENT_READ, [index, b""])
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while self.running:
+            for key, _ in self.selector.select(timeout=0.2):
+                now = time.perf_counter()
+                try:
+                    data = key.fileobj.recv(65536)
+                except BlockingIOError:
+                    continue
+                if not data:
+                    self.selector.unregister(key.fileobj)
+                    continue
+                state = key.data
+                index = state[0]
+                self.connected[index] = True
+                frames = (state[1] + data).split(b"\n\n")
+                state[1] = frames.pop()
+                for frame in frames:
+                    if CONNECTED_PATTERN.search(frame):
+                        self.serial_connected[index] = True
+                    match = DISTANCE_PATTERN.search(frame)
+                    if match is None:
+                        continue
+                    sent = self.send_times.get(int(match.group(1)))
+                    if sent is not None:
+                        self.received[index] += 1
+                        self.latencies.append(now - sent)
+
+    def close(self):
+        self.running = False
+        self.thread.join()
+        for key in list(self.selector.get_map().values()):
+            key.fileobj.close()
+        self.selector.close()
+
+
+def run_configuration(server, rate, clients, duration, port):
+    master, slave = os.openpty()
+    tty.setraw(slave)
+    env = dict(os.environ, SERIAL_PORT=os.ttyname(slave), WEB_PORT=str(port))
+    process = subprocess.Popen([sys.executable, server], env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    stream_clients = None
+    try:
+        if not wait_for_port(port):
+            raise RuntimeError(f"{server} did not start listening on port {port}")
+        send_times = {}
+        stream_clients = StreamClients(port, clients, send_times)
+        # Readings written before the server has opened the pty would just be lost
+        deadline = time.monotonic() + SERIAL_CONNECT_TIMEOUT
+        while not all(stream_clients.serial_connected) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        if not all(stream_clients.serial_connected):
+            raise RuntimeError(f"{server} did not connect to {os.ttyname(slave)} "
+                               f"within {SERIAL_CONNECT_TIMEOUT:g} s")
+
+        readings = min(int(rate * duration), MAX_READINGS)
+        cpu_before, wall_before = process_cpu_seconds(process.pid), time.perf_counter()
+        for index in range(readings):
+            due = wall_before + index / rate
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            distance = index + 1
+            send_times[distance] = time.perf_counter()
+            os.write(master, b"distance: %d mm\r\n" % distance)
+        send_elapsed = time.perf_counter() - wall_before
+
+        time.sleep(1.0)  # let the last readings drain to every client
+        cpu_after, wall_after = process_cpu_seconds(process.pid), time.perf_counter()
+    finally:
+        if stream_clients is not None:
+            stream_clients.close()
+        process.terminate()
+        process.wait()
+        os.close(master)
+        os.close(slave)
+
+    latencies = sorted(stream_clients.latencies)
+    delivered = sum(stream_clients.received)
+    cpu_percent = None
+    if cpu_before is not None and cpu_after is not None:
+        cpu_percent = 100.0 * (cpu_after - cpu_before) / (wall_after - wall_before)
+    to_ms = lambda value: None if value is None else round(value * 1000, 3)
+    return {
+        "rate": rate,
+        "clients": clients,
+        "readings_sent": readings,
+        "send_rate": round(readings / send_elapsed, 1),
+        "readings_delivered": delivered,
+        "dropped": readings * clients - delivered,
+        "throughput": round(delivered / send_elapsed, 1),
+        "latency_p50_ms": to_ms(percentile(latencies, 0.50)),
+        "latency_p99_ms": to_ms(percentile(latencies, 0.99)),
+        "latency_p999_ms": to_ms(percentile(latencies, 0.999)),
+        "latency_max_ms": to_ms(latencies[-1] if latencies else None),
+        "server_cpu_percent": None if cpu_percent is None else round(cpu_percent, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serial-to-SSE latency benchmark")
+    parser.add_argument('--server', default=DEFAULT_SERVER, help="server script to benchmark")
+    parser.add_argument('--rates', default='20,100,500,1000', help="readings per second, comma separated")
+    parser.add_argument('--clients', default='1,10,30', help="concurrent SSE clients, comma separated")
+    parser.add_argument('--duration', type=float, default=10.0, help="seconds per configuration")
+    parser.add_argument('--port', type=int, default=5077, help="port the server is started on")
+    parser.add_argument('--output', help="write machine-readable results (JSON) to this file")
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'rate':>7} {'clients':>7} {'sent':>7} {'dropped':>8} {'msg/s':>9} "
+          f"{'p50 ms':>8} {'p99 ms':>8} {'p999 ms':>8} {'cpu %':>6}")
+    for rate in [float(value) for value in args.rates.split(',')]:
+        for clients in [int(value) for value in args.clients.split(',')]:
+            try:
+                result = run_configuration(args.server, rate, clients, args.duration, args.port)
+            except RuntimeError as e:
+                print(f"[ERROR] {e}")
+                sys.exit(1)
+            results.append(result)
+            print(f"{rate:>7g} {clients:>7} {result['readings_sent']:>7} {result['dropped']:>8} "
+                  f"{result['throughput']:>9} {result['latency_p50_ms']!s:>8} {result['latency_p99_ms']!s:>8} "
+                  f"{result['latency_p999_ms']!s:>8} {result['server_cpu_percent']!s:>6}")
+
+    if any(result['readings_delivered'] == 0 for result in results):
+        print("[ERROR] No readings were delivered in at least one configuration; results not written")
+        sys.exit(1)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                "timestamp": datetime.now().isoformat(),
+                "server": args.server,
+                "duration": args.duration,
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "results": results,
+            }, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
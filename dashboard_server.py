@@ -0,0 +1,357 @@
+# --- Dashboard Server ---
+# Everything the dashboard scripts share: configuration, one SensorChannel per
+# sensor, metrics, the query and toggle handlers, and the Flask routes and
+# asyncio route table serving them. Each script only brings its page template
+# and calls run_dashboard().
+import serial
+import sys
+import time
+import os
+from datetime import datetime
+import pipeline_metrics
+from flask import Flask, Response, render_template_string, request, jsonify
+from data_logger import CsvLogger
+from proximity_zones import DANGER_MM, DEBOUNCE_SAMPLES, HYSTERESIS_MM, MIN_VALID_MM, WARNING_MM
+from distance_pyramid import AGGREGATE_POINTS, scaled_levels
+from line_index import LINE_INDEX_CAPACITY, SEARCH_PAGE_SIZE
+from static_assets import StaticAsset
+from sensor_channel import HISTORY_PAGE_SIZE, SensorChannel, ZoneStream, parse_port_list, parse_timestamp
+
+# Check for required libraries
+try:
+    import serial
+    print(f"[INFO] Required libraries found - pyserial: {serial.__version__}")
+except ImportError as e:
+    print(f"[ERROR] Missing required library: {e}")
+    print("[INFO] Please install: pip install pyserial flask")
+    exit(1)
+
+# --- Serial Configuration ---
+# A real port name, or sim://... / replay://... (see serial_sources.py)
+SERIAL_PORT = os.environ.get('SERIAL_PORT', 'COM7')
+# Several sensors at once: "front=COM7,rear=COM8" (overrides SERIAL_PORT)
+SERIAL_PORTS = os.environ.get('SERIAL_PORTS', SERIAL_PORT)
+SERIAL_BAUDRATE = 9600
+SERIAL_READ_TIMEOUT = 1.0
+
+# --- Zone Configuration ---
+ZONE_MIN_VALID_MM = int(os.environ.get('ZONE_MIN_VALID_MM', MIN_VALID_MM))
+ZONE_DANGER_MM = int(os.environ.get('ZONE_DANGER_MM', DANGER_MM))
+ZONE_WARNING_MM = int(os.environ.get('ZONE_WARNING_MM', WARNING_MM))
+ZONE_HYSTERESIS_MM = int(os.environ.get('ZONE_HYSTERESIS_MM', HYSTERESIS_MM))
+ZONE_DEBOUNCE = int(os.environ.get('ZONE_DEBOUNCE', DEBOUNCE_SAMPLES))
+
+# --- Web Server Configuration ---
+WEB_PORT = int(os.environ.get('WEB_PORT', 5000))
+# "threaded" (Flask, one thread per client) or "asyncio" (async_server.py, one
+# coroutine per client, for hundreds or thousands of dashboards); --async also selects asyncio
+SERVER_MODE = 'asyncio' if '--async' in sys.argv else os.environ.get('SERVER_MODE', 'threaded')
+
+# --- History Configuration ---
+# Preallocated per sensor at startup (~40 MB with the defaults); lower them
+# when running many sensors
+HISTORY_CAPACITY = int(os.environ.get('HISTORY_CAPACITY', 1_000_000))  # readings kept (~13 MB)
+SEARCH_CAPACITY = int(os.environ.get('SEARCH_CAPACITY', LINE_INDEX_CAPACITY))  # lines indexed for /search (~20 MB)
+AGGREGATE_SCALE = float(os.environ.get('AGGREGATE_SCALE', 1.0))  # share of the 1 h/24 h/7 d/30 d pyramid (~6.3 MB)
+
+# --- Chart Configuration ---
+CHART_SECONDS = int(os.environ.get('CHART_SECONDS', 30))  # time span of the dashboard's distance chart
+CHART_MAX_MM = int(os.environ.get('CHART_MAX_MM', 2000))  # top of the chart; the VL53L0X reaches ~2 m
+
+# --- Console Configuration ---
+# Seconds between echoed [SERIAL] lines per sensor (0 = every line, negative = none);
+# printing every line of a fast sensor costs more than handling it
+SERIAL_ECHO_INTERVAL = float(os.environ.get('SERIAL_ECHO_INTERVAL', 1.0))
+
+# --- Filter Configuration ---
+# none, median:<window>, ema:<alpha> or kalman:<process noise>,<measurement noise>
+DISTANCE_FILTER = os.environ.get('DISTANCE_FILTER', 'median:5')
+
+# --- Global Variables ---
+start_time = datetime.now()
+data_logger = CsvLogger()
+zone_stream = ZoneStream()
+zone_settings = {
+    "min_valid_mm": ZONE_MIN_VALID_MM,
+    "danger_mm": ZONE_DANGER_MM,
+    "warning_mm": ZONE_WARNING_MM,
+    "hysteresis_mm": ZONE_HYSTERESIS_MM,
+    "debounce": ZONE_DEBOUNCE
+}
+# One channel (reader thread, history, stats, subscribers) per sensor
+sensors = {
+    sensor_id: SensorChannel(sensor_id, port, SERIAL_BAUDRATE, SERIAL_READ_TIMEOUT, HISTORY_CAPACITY,
+                             DISTANCE_FILTER, zone_settings, data_logger, zone_stream,
+                             SERIAL_ECHO_INTERVAL if SERIAL_ECHO_INTERVAL >= 0 else None,
+                             SEARCH_CAPACITY, scaled_levels(AGGREGATE_SCALE))
+    for sensor_id, port in parse_port_list(SERIAL_PORTS)
+}
+
+# --- Metrics ---
+# Stage timings are recorded by the pipeline itself; these are read at scrape time
+def per_sensor(value):
+    return lambda: [({"sensor": sensor_id}, value(channel)) for sensor_id, channel in sensors.items()]
+
+for metric in (
+    pipeline_metrics.Sampled('vl53_messages_total', "Lines received", per_sensor(lambda c: c.state.message_count),
+                             'counter'),
+    pipeline_metrics.Sampled('vl53_bytes_total', "Bytes received", per_sensor(lambda c: c.state.total_bytes),
+                             'counter'),
+    pipeline_metrics.Sampled('vl53_stream_subscribers', "Threaded /stream clients",
+                             per_sensor(lambda c: len(c.broadcaster) + sum(len(e.broadcaster) for e in c.encoded.values()))),
+    pipeline_metrics.Sampled('vl53_stream_dropped_total', "Frames dropped for slow /stream clients",
+                             per_sensor(lambda c: c.broadcaster.dropped), 'counter'),
+    pipeline_metrics.Sampled('vl53_log_dropped_total', "Rows dropped by the CSV logger",
+                             lambda: [({}, data_logger.dropped)], 'counter'),
+    pipeline_metrics.Sampled('vl53_record_dropped_total', "Readings dropped by the binary recorder",
+                             per_sensor(lambda c: c.recorder.dropped), 'counter'),
+    pipeline_metrics.Sampled('vl53_link_events_total', "Reading gaps, duplicates, late arrivals, restarts and corrupt lines",
+                             lambda: [({"sensor": sensor_id, "kind": kind}, getattr(channel.state.link, kind))
+                                      for sensor_id, channel in sensors.items()
+                                      for kind in ('gaps', 'duplicates', 'late', 'restarts', 'corrupt')], 'counter'),
+    pipeline_metrics.Sampled('vl53_readings_missing', "Readings that never arrived (late ones excepted)",
+                             per_sensor(lambda c: c.state.link.missing)),
+):
+    pipeline_metrics.register(metric)
+
+# --- Flask Setup ---
+app = Flask(__name__, static_folder=None)  # /static/ is served from static_files below
+
+# Disable Flask logging for cleaner output
+import logging
+log = logging.getLogger('werkzeug')
+log.setLevel(logging.WARNING)
+
+
+def selected_sensor():
+    """The channel named by ?sensor=..., or the first one configured."""
+    sensor_id = request.args.get('sensor')
+    if sensor_id is None:
+        return next(iter(sensors.values()))
+    return sensors.get(sensor_id)
+
+# --- Static Assets ---
+# Everything the dashboard loads is prepared once, by install_pages(); see static_assets.py
+static_files = {}
+# The sensor set is fixed at startup, so so is every page
+index_pages = {}
+
+def render_index(html_page, sensor_id):
+    channel = sensors[sensor_id]
+    # Rendered at startup, outside any Flask request
+    with app.app_context():
+        return render_template_string(html_page, port=channel.port, baudrate=SERIAL_BAUDRATE,
+                                      sensors=list(sensors), sensor=channel.sensor_id,
+                                      chart_seconds=CHART_SECONDS, chart_max_mm=CHART_MAX_MM,
+                                      danger_mm=zone_settings["danger_mm"], warning_mm=zone_settings["warning_mm"],
+                                      css_url=static_files["/static/dashboard.css"].url("/static/dashboard.css"),
+                                      js_url=static_files["/static/dashboard.js"].url("/static/dashboard.js"))
+
+def install_pages(html_page, css, js):
+    """Prepare a dashboard's stylesheet, script and one page per sensor."""
+    static_files["/static/dashboard.css"] = StaticAsset(css, "text/css; charset=utf-8")
+    static_files["/static/dashboard.js"] = StaticAsset(js, "application/javascript; charset=utf-8")
+    for sensor_id in sensors:
+        index_pages[sensor_id] = StaticAsset(render_index(html_page, sensor_id), "text/html; charset=utf-8")
+
+def asset_response(asset):
+    status, headers, body = asset.response(request.headers.get('Accept-Encoding'),
+                                           request.headers.get('If-None-Match'), request.args.get('v'))
+    return Response(body, status, headers)
+
+def sensor_summaries():
+    return [channel.summary() for channel in sensors.values()]
+
+def query_channel(args):
+    sensor_id = args.get('sensor') or next(iter(sensors))
+    if sensor_id not in sensors:
+        raise LookupError(f"unknown sensor {sensor_id}")
+    return sensors[sensor_id]
+
+def optional(args, name, convert):
+    value = args.get(name)
+    return None if value in (None, '') else convert(value)
+
+def history_query(args):
+    """One /history page for ?sensor=&start=&end=&limit=&cursor=&downsample= (start/end: Unix or ISO time)."""
+    return query_channel(args).history_page(
+        start=optional(args, 'start', parse_timestamp), end=optional(args, 'end', parse_timestamp),
+        limit=optional(args, 'limit', int) or HISTORY_PAGE_SIZE, cursor=optional(args, 'cursor', int),
+        downsample=optional(args, 'downsample', float))
+
+def aggregates_query(args):
+    """Min/max/mean buckets for ?sensor=&start=&end=&points=&resolution= (resolution in seconds)."""
+    return query_channel(args).aggregates(
+        start=optional(args, 'start', parse_timestamp), end=optional(args, 'end', parse_timestamp),
+        points=optional(args, 'points', int) or AGGREGATE_POINTS,
+        resolution=optional(args, 'resolution', float))
+
+def search_query(args):
+    """Received lines for ?sensor=&q=&regex=&start=&end=&limit=&cursor=&context= (q: text, case-insensitive)."""
+    return query_channel(args).search(
+        text=args.get('q'), regex=args.get('regex'),
+        start=optional(args, 'start', parse_timestamp), end=optional(args, 'end', parse_timestamp),
+        limit=optional(args, 'limit', int) or SEARCH_PAGE_SIZE, cursor=optional(args, 'cursor', int),
+        context=optional(args, 'context', int) or 0)
+
+def toggle_logging_state():
+    # The logging stage opens and closes files on its own thread
+    if data_logger.active:
+        data_logger.stop()
+        print(f"[INFO] Stopped logging")
+    else:
+        data_logger.start()
+        print(f"[INFO] Started logging to {data_logger.filename}")
+    return {"logging": data_logger.active, "filename": data_logger.filename}
+
+def toggle_recording_state():
+    # One recording file per sensor, started and stopped together
+    recording = not any(channel.recorder.active for channel in sensors.values())
+    for channel in sensors.values():
+        if recording:
+            channel.recorder.start()
+            print(f"[INFO] Started recording to {channel.recorder.filename}")
+        else:
+            channel.recorder.stop()
+    if not recording:
+        print(f"[INFO] Stopped recording")
+    return {"recording": recording,
+            "filenames": {sensor_id: channel.recorder.filename for sensor_id, channel in sensors.items()}}
+
+@app.route("/")
+def index():
+    channel = selected_sensor() or next(iter(sensors.values()))
+    return asset_response(index_pages[channel.sensor_id])
+
+@app.route("/static/<name>")
+def static_file(name):
+    asset = static_files.get(request.path)
+    if asset is None:
+        return "Not Found", 404
+    return asset_response(asset)
+
+@app.route("/sensors")
+def sensor_list():
+    return jsonify(sensor_summaries())
+
+@app.route("/history")
+def history():
+    try:
+        return jsonify(history_query(request.args))
+    except LookupError as e:
+        return jsonify({"error": str(e)}), 404
+    except ValueError as e:
+        return jsonify({"error": f"bad query: {e}"}), 400
+
+@app.route("/aggregates")
+def aggregates():
+    try:
+        return jsonify(aggregates_query(request.args))
+    except LookupError as e:
+        return jsonify({"error": str(e)}), 404
+    except ValueError as e:
+        return jsonify({"error": f"bad query: {e}"}), 400
+
+@app.route("/metrics")
+def metrics():
+    return Response(pipeline_metrics.render(), content_type=pipeline_metrics.CONTENT_TYPE)
+
+@app.route("/search")
+def search():
+    try:
+        return jsonify(search_query(request.args))
+    except LookupError as e:
+        return jsonify({"error": str(e)}), 404
+    except ValueError as e:
+        return jsonify({"error": f"bad query: {e}"}), 400
+
+@app.route("/stream")
+def stream():
+    print("[DEBUG] Stream route accessed")
+    channel = selected_sensor()
+    if channel is None:
+        return jsonify({"error": f"unknown sensor {request.args.get('sensor')}"}), 404
+    
+    # ?format=compact: key frames plus small delta frames (see stream_encoding.py)
+    encoding = request.args.get('format', 'json')
+    if encoding not in ('json', 'compact'):
+        return jsonify({"error": f"unsupported format {encoding} on /stream"}), 400
+    
+    # EventSource resends the id of the last frame it saw when it reconnects
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    response = Response(channel.stream(last_event_id, None if encoding == 'json' else encoding),
+                        mimetype="text/event-stream")
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['Access-Control-Allow-Origin'] = '*'
+    return response
+
+@app.route("/zones")
+def zones():
+    # Zone transitions from every sensor: a low-volume stream for alerting consumers
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    response = Response(zone_stream.stream(last_event_id), mimetype="text/event-stream")
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['Access-Control-Allow-Origin'] = '*'
+    return response
+
+@app.route("/toggle_logging", methods=["POST"])
+def toggle_logging():
+    try:
+        return jsonify(toggle_logging_state())
+    
+    except Exception as e:
+        print(f"[ERROR] Logging toggle failed: {e}")
+        return jsonify({"error": str(e)})
+
+@app.route("/toggle_recording", methods=["POST"])
+def toggle_recording():
+    try:
+        return jsonify(toggle_recording_state())
+    
+    except Exception as e:
+        print(f"[ERROR] Recording toggle failed: {e}")
+        return jsonify({"error": str(e)})
+
+def run_dashboard(html_page, css, js, title):
+    """Serve a dashboard page (with its stylesheet and script) until interrupted."""
+    try:
+        install_pages(html_page, css, js)
+        print(f"[INFO] {title} Starting...")
+        for channel in sensors.values():
+            print(f"[INFO] Configuration: {channel.sensor_id} on {channel.port} @ {SERIAL_BAUDRATE} baud")
+        
+        if SERVER_MODE == 'asyncio':
+            # Serial readers and every client connection share one event loop
+            from async_server import AsyncDashboardServer
+            server = AsyncDashboardServer(
+                sensors, zone_stream, index_pages, static_files,
+                get_routes={"/sensors": lambda args: sensor_summaries(), "/history": history_query,
+                            "/aggregates": aggregates_query, "/search": search_query},
+                post_routes={"/toggle_logging": toggle_logging_state, "/toggle_recording": toggle_recording_state})
+            print(f"[INFO] Starting asyncio web server...")
+        else:
+            # Start one serial reader thread per sensor
+            print(f"[INFO] Starting {len(sensors)} serial reader thread(s)...")
+            for channel in sensors.values():
+                channel.start()
+            time.sleep(1)  # Give serial threads time to start
+            print(f"[INFO] Starting Flask web server...")
+        
+        print(f"[INFO] 🌐 Access dashboard at: http://localhost:{WEB_PORT}")
+        print(f"[INFO] 🌐 Or from network: http://10.157.212.51:{WEB_PORT}")
+        print(f"[INFO] Press Ctrl+C to stop")
+        
+        if SERVER_MODE == 'asyncio':
+            server.run("0.0.0.0", WEB_PORT)
+        else:
+            # Run Flask
+            app.run(host="0.0.0.0", port=WEB_PORT, debug=False, threaded=True, use_reloader=False)
+        
+    except KeyboardInterrupt:
+        print(f"\\n[INFO] Server stopped by user")
+    except Exception as e:
+        print(f"[ERROR] Application failed: {e}")
+        import traceback
+        traceback.print_exc()
+    finally:
+        print(f"[INFO] Application ended")
\ No newline at end of file
@@ -0,0 +1,161 @@
+import csv
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+import pipeline_metrics
+
+# --- Logging Configuration ---
+LOG_QUEUE_SIZE = 100000          # rows buffered before new ones are dropped
+LOG_BATCH_SIZE = 500             # rows written per batch
+LOG_FLUSH_INTERVAL = 1.0         # seconds a partial batch may wait before it is written
+LOG_MAX_BYTES = 64 * 1024 * 1024 # rotate once a file grows past this size
+LOG_MAX_AGE = 60 * 60            # ... or once it has been open this many seconds
+
+
+class LogStage:
+    """File logging stage that runs beside the serial reader.
+
+    The reader only enqueues rows with ``log()``, which never touches the disk and
+    never blocks. A worker thread owns one long-lived file handle, writes rows in
+    batches (flushed by size or time) and rotates to a new timestamped file by
+    size or age, so a slow disk cannot stall ingest. Subclasses define the file
+    format through ``_open()`` and ``_write_batch()``.
+    """
+
+    extension = ''
+    stage = 'log_write'  # pipeline_metrics stage timed for every batch
+
+    def __init__(self, prefix, batch_size=LOG_BATCH_SIZE, flush_interval=LOG_FLUSH_INTERVAL,
+                 max_bytes=LOG_MAX_BYTES, max_age=LOG_MAX_AGE, queue_size=LOG_QUEUE_SIZE):
+        self.prefix = prefix
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.queue_size = queue_size
+        self.queue = None
+        self.stop_event = None
+        self.filename = ""
+        self.dropped = 0
+
+    @property
+    def active(self):
+        return self.queue is not None
+
+    def start(self):
+        """Start a logging session and return the first file name; never waits on the disk."""
+        if self.active:
+            return self.filename
+        self.filename = self._next_filename()
+        self.queue = queue.Queue(maxsize=self.queue_size)
+        self.stop_event = threading.Event()
+        threading.Thread(target=self._run, args=(self.queue, self.stop_event, self.filename),
+                         daemon=True).start()
+        return self.filename
+
+    def stop(self):
+        """End the session; the worker writes out whatever is still queued and closes the file."""
+        if self.active:
+            self.stop_event.set()
+            self.queue = None
+
+    def log(self, *row):
+        """Queue one row if logging is on."""
+        log_queue = self.queue
+        if log_queue is None:
+            return
+        try:
+            log_queue.put_nowait(row)
+        except queue.Full:
+            self.dropped += 1
+
+    def _next_filename(self):
+        base = f"{self.prefix}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        filename, suffix = f"{base}{self.extension}", 1
+        while os.path.exists(filename) or filename == self.filename:
+            filename = f"{base}_{suffix}{self.extension}"
+            suffix += 1
+        return filename
+
+    def _open(self, filename):
+        """Create ``filename``, write any header and return the open handle."""
+        raise NotImplementedError
+
+    def _write_batch(self, handle, batch):
+        raise NotImplementedError
+
+    def _run(self, log_queue, stop_event, filename):
+        try:
+            handle = self._open(filename)
+            opened_at = time.monotonic()
+        except OSError as e:
+            print(f"[ERROR] Logging failed: {e}")
+            self._end_session(log_queue)
+            return
+
+        batch = []
+        write_time = pipeline_metrics.stage(self.stage)
+        deadline = time.monotonic() + self.flush_interval
+        try:
+            while True:
+                try:
+                    batch.append(log_queue.get(timeout=max(deadline - time.monotonic(), 0)))
+                    while len(batch) < self.batch_size:
+                        batch.append(log_queue.get_nowait())
+                except queue.Empty:
+                    pass
+
+                stopping = stop_event.is_set()
+                now = time.monotonic()
+                if batch and (len(batch) >= self.batch_size or now >= deadline or stopping):
+                    started = time.perf_counter()
+                    self._write_batch(handle, batch)
+                    handle.flush()
+                    write_time.time(started)
+                    batch.clear()
+                if now >= deadline:
+                    deadline = now + self.flush_interval
+
+                if stopping and log_queue.empty():
+                    break
+
+                # Rotate between batches so a row never straddles two files
+                if handle.tell() >= self.max_bytes or now - opened_at >= self.max_age:
+                    handle.close()
+                    filename = self._next_filename()
+                    self.filename = filename
+                    handle = self._open(filename)
+                    opened_at = time.monotonic()
+                    print(f"[INFO] Rotated log to {filename}")
+        except OSError as e:
+            print(f"[ERROR] Logging failed: {e}")
+            self._end_session(log_queue)
+        finally:
+            handle.close()
+
+    def _end_session(self, log_queue):
+        # The worker is gone, so logging is off; unless a newer session has already replaced this one
+        if self.queue is log_queue:
+            self.queue = None
+
+
+class CsvLogger(LogStage):
+    """Logs ``(timestamp, *fields)`` rows as CSV, with the timestamp written in ISO format."""
+
+    extension = '.csv'
+
+    def __init__(self, prefix='serial_log', header=('Timestamp', 'Sensor', 'Data'), **kwargs):
+        super().__init__(prefix, **kwargs)
+        self.header = header
+
+    def _open(self, filename):
+        handle = open(filename, 'w', newline='')
+        csv.writer(handle).writerow(self.header)
+        return handle
+
+    def _write_batch(self, handle, batch):
+        csv.writer(handle).writerows(
+            (datetime.fromtimestamp(row[0]).isoformat(),) + row[1:] for row in batch)
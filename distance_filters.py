@@ -0,0 +1,91 @@
+from bisect import bisect_left, insort
+from collections import deque
+
+# --- Streaming Filters ---
+# Each filter takes one valid distance (mm) per call and returns the smoothed
+# value, with constant work per sample. ERROR readings are never fed in, so a
+# sensor glitch does not drag the estimate towards 0xFFFF.
+MEDIAN_WINDOW = 5
+EMA_ALPHA = 0.3
+KALMAN_PROCESS_NOISE = 1.0       # mm^2 the target may move between readings
+KALMAN_MEASUREMENT_NOISE = 16.0  # mm^2 of VL53L0X ranging noise
+
+
+class PassThrough:
+    """No smoothing; smoothed and raw distance are identical."""
+
+    def update(self, distance):
+        return distance
+
+
+class RunningMedian:
+    """Median of the last ``window`` readings, kept in a small sorted window."""
+
+    def __init__(self, window=MEDIAN_WINDOW):
+        self.window = max(1, int(window))
+        self.samples = deque()
+        self.ordered = []
+
+    def update(self, distance):
+        self.samples.append(distance)
+        insort(self.ordered, distance)
+        if len(self.samples) > self.window:
+            del self.ordered[bisect_left(self.ordered, self.samples.popleft())]
+        count = len(self.ordered)
+        middle = count // 2
+        if count % 2:
+            return self.ordered[middle]
+        return (self.ordered[middle - 1] + self.ordered[middle]) / 2
+
+
+class ExponentialMovingAverage:
+    """EMA with smoothing factor ``alpha`` (1 = no smoothing)."""
+
+    def __init__(self, alpha=EMA_ALPHA):
+        self.alpha = float(alpha)
+        self.value = None
+
+    def update(self, distance):
+        if self.value is None:
+            self.value = float(distance)
+        else:
+            self.value += self.alpha * (distance - self.value)
+        return self.value
+
+
+class Kalman1D:
+    """Scalar Kalman filter for a slowly moving target (constant-position model)."""
+
+    def __init__(self, process_noise=KALMAN_PROCESS_NOISE, measurement_noise=KALMAN_MEASUREMENT_NOISE):
+        self.process_noise = float(process_noise)
+        self.measurement_noise = float(measurement_noise)
+        self.estimate = None
+        self.variance = 0.0
+
+    def update(self, distance):
+        if self.estimate is None:
+            self.estimate = float(distance)
+            self.variance = self.measurement_noise
+            return self.estimate
+        self.variance += self.process_noise
+        gain = self.variance / (self.variance + self.measurement_noise)
+        self.estimate += gain * (distance - self.estimate)
+        self.variance *= 1 - gain
+        return self.estimate
+
+
+FILTERS = {
+    'none': PassThrough,
+    'median': RunningMedian,
+    'ema': ExponentialMovingAverage,
+    'kalman': Kalman1D,
+}
+
+
+def make_filter(spec):
+    """Build a filter from a spec such as ``median:5``, ``ema:0.3``, ``kalman:1,16`` or ``none``."""
+    name, _, params = spec.strip().lower().partition(':')
+    if name not in FILTERS:
+        raise ValueError(f"unknown distance filter '{name}' (expected one of {', '.join(FILTERS)})")
+    args = [float(value) for value in params.split(',') if value.strip()]
+    return FILTERS[name](*args)
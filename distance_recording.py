@@ -0,0 +1,155 @@
+import mmap
+import struct
+import sys
+from datetime import datetime
+
+from data_logger import LogStage
+from distance_store import DISTANCE_ERROR, FLAG_ERROR, record_flags
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# --- Recording Format ---
+# A 16-byte header followed by fixed-width little-endian records:
+#   float64 Unix timestamp | uint16 distance (mm, 0xFFFF on error) | uint8 flags | pad
+# with the flags laid out as in DistanceHistory (error bit, zone bits).
+# Fixed width makes sample i live at HEADER.size + i * RECORD.size.
+RECORDING_MAGIC = b'VL53REC\x00'
+RECORDING_VERSION = 1
+HEADER = struct.Struct('<8sHH4x')
+RECORD = struct.Struct('<dHBx')
+RECORDING_EXTENSION = '.vlrec'
+
+RECORD_DTYPE = None
+if numpy is not None:
+    RECORD_DTYPE = numpy.dtype([('timestamp', '<f8'), ('distance', '<u2'), ('flags', 'u1'), ('pad', 'u1')])
+
+RECORDING_MAX_BYTES = 4 * 1024 * 1024 * 1024  # ~358 million samples per file
+RECORDING_MAX_AGE = 24 * 60 * 60
+
+
+class BinaryRecorder(LogStage):
+    """Records ``(timestamp, distance, flags)`` rows in the fixed-width binary format."""
+
+    extension = RECORDING_EXTENSION
+    stage = 'record_write'
+
+    def __init__(self, prefix='distance_rec', max_bytes=RECORDING_MAX_BYTES,
+                 max_age=RECORDING_MAX_AGE, **kwargs):
+        super().__init__(prefix, max_bytes=max_bytes, max_age=max_age, **kwargs)
+
+    def _open(self, filename):
+        handle = open(filename, 'wb')
+        handle.write(HEADER.pack(RECORDING_MAGIC, RECORDING_VERSION, RECORD.size))
+        return handle
+
+    def _write_batch(self, handle, batch):
+        pack = RECORD.pack
+        handle.write(b''.join(pack(timestamp, distance, flags) for timestamp, distance, flags in batch))
+
+
+class Recording:
+    """Read-only, memory-mapped view of a recording.
+
+    Opening costs one header read no matter how large the file is; samples are
+    decoded straight from the mapping on access, and ``index_at()`` finds a time
+    by binary search over the fixed-width records.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        try:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self.file.close()
+            raise ValueError(f"{path} is empty")
+        if len(self.map) < HEADER.size:
+            self.close()
+            raise ValueError(f"{path} is truncated: shorter than the {HEADER.size}-byte header")
+        magic, version, record_size = HEADER.unpack_from(self.map, 0)
+        if magic != RECORDING_MAGIC or version != RECORDING_VERSION or record_size != RECORD.size:
+            self.close()
+            raise ValueError(f"{path} is not a version {RECORDING_VERSION} distance recording")
+        # A torn final record from an interrupted write is ignored
+        self.count = (len(self.map) - HEADER.size) // RECORD.size
+
+    def __len__(self):
+        return self.count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(self.records(*index.indices(self.count)[:2]))
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError("recording index out of range")
+        return RECORD.unpack_from(self.map, HEADER.size + index * RECORD.size)[:3]
+
+    def timestamp(self, index):
+        return struct.unpack_from('<d', self.map, HEADER.size + index * RECORD.size)[0]
+
+    def records(self, start=0, stop=None):
+        """Iterate ``(timestamp, distance, flags)`` for samples ``start <= i < stop``."""
+        stop = self.count if stop is None else min(stop, self.count)
+        if stop <= start:
+            return
+        view = memoryview(self.map)[HEADER.size + start * RECORD.size:HEADER.size + stop * RECORD.size]
+        try:
+            for timestamp, distance, flags in RECORD.iter_unpack(view):
+                yield timestamp, distance, flags
+        finally:
+            view.release()
+
+    def index_at(self, timestamp):
+        """Index of the first sample at or after ``timestamp``."""
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.timestamp(mid) < timestamp:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def between(self, start_time, end_time):
+        """Iterate the samples with ``start_time <= timestamp < end_time``."""
+        return self.records(self.index_at(start_time), self.index_at(end_time))
+
+    def to_numpy(self):
+        """Zero-copy structured NumPy view of every sample (requires numpy)."""
+        if numpy is None:
+            raise RuntimeError("numpy is not installed")
+        return numpy.frombuffer(self.map, dtype=RECORD_DTYPE, count=self.count, offset=HEADER.size)
+
+
+def record_row(timestamp, record):
+    """Row for BinaryRecorder.log() from a parsed DistanceRecord."""
+    return timestamp, DISTANCE_ERROR if record.error else record.distance_mm, record_flags(record)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print(f"Usage: python {sys.argv[0]} <recording{RECORDING_EXTENSION}>")
+        sys.exit(1)
+
+    with Recording(sys.argv[1]) as recording:
+        print(f"Samples: {len(recording)}")
+        if len(recording):
+            first, last = recording.timestamp(0), recording.timestamp(len(recording) - 1)
+            errors = sum(1 for _, _, flags in recording.records() if flags & FLAG_ERROR)
+            print(f"From:    {datetime.fromtimestamp(first).isoformat()}")
+            print(f"To:      {datetime.fromtimestamp(last).isoformat()}")
+            print(f"Errors:  {errors}")
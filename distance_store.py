@@ -0,0 +1,173 @@
+import re
+import threading
+from array import array
+from collections import namedtuple
+
+from proximity_zones import ZONES
+
+# --- Record Parsing ---
+# uart_send_distance() in I2C_Vl52l0x_UART.c emits either
+# "distance: <mm> mm" or "distance: ERROR" (the 0xFFFF read failure sentinel).
+DISTANCE_ERROR = 0xFFFF
+FLAG_ERROR = 0x01
+# Bits 1-2 of the flags hold the proximity zone (0 = not classified)
+FLAG_ZONE_SHIFT = 1
+FLAG_ZONE_MASK = 0x06
+_ZONE_CODES = {zone: code for code, zone in enumerate(ZONES, 1)}
+_ZONE_BY_CODE = (None,) + ZONES
+
+DistanceRecord = namedtuple('DistanceRecord', ['arrival', 'distance_mm', 'error', 'smoothed_mm', 'zone'],
+                            defaults=[None, None])
+
+_DISTANCE_PATTERN = re.compile(rb'distance:\s*(?:(\d+)\s*mm|(ERROR))\s*$')
+
+
+def parse_distance(arrival, line):
+    """Parse one firmware line (bytes) into a DistanceRecord, or None if it is not a reading."""
+    match = _DISTANCE_PATTERN.match(line)
+    if match is None:
+        return None
+    if match.group(2):
+        return DistanceRecord(arrival, None, True)
+    distance = int(match.group(1))
+    if distance >= DISTANCE_ERROR:
+        return DistanceRecord(arrival, None, True)
+    return DistanceRecord(arrival, distance, False)
+
+
+def record_flags(record):
+    """Pack the error flag and zone of ``record`` into one flags byte."""
+    flags = FLAG_ERROR if record.error else 0
+    if record.zone is not None:
+        flags |= _ZONE_CODES[record.zone] << FLAG_ZONE_SHIFT
+    return flags
+
+
+def format_distance(record):
+    """Render a record back into the firmware's line format."""
+    if record.error:
+        return "distance: ERROR"
+    return f"distance: {record.distance_mm} mm"
+
+
+# --- History Ring Buffer ---
+class DistanceHistory:
+    """Preallocated ring buffer of readings stored column-wise in ``array`` objects.
+
+    Each sample costs 13 bytes (float64 arrival, uint16 raw and smoothed
+    distance, uint8 flags holding the error bit and zone), so a million
+    readings fit in about 13 MB. Every appended record gets a sequence
+    number (its position since start-up); the last ``capacity`` of them are kept.
+    The columns support the buffer protocol, so ``numpy.frombuffer`` can wrap them
+    without copying.
+
+    Arrival stamps come from the monotonic clock and never decrease, so the ring
+    doubles as a time index: ``seq_at()`` finds a time by binary search.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.arrivals = array('d', bytes(8 * capacity))
+        self.distances = array('H', bytes(2 * capacity))
+        self.smoothed = array('H', bytes(2 * capacity))
+        self.flags = array('B', bytes(capacity))
+        self.total = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return min(self.total, self.capacity)
+
+    @property
+    def first_seq(self):
+        """Sequence number of the oldest record still held."""
+        return max(0, self.total - self.capacity)
+
+    def append(self, record):
+        """Store ``record`` and return its sequence number."""
+        with self.lock:
+            seq = self.total
+            slot = seq % self.capacity
+            self.arrivals[slot] = record.arrival
+            self.distances[slot] = DISTANCE_ERROR if record.error else record.distance_mm
+            self.smoothed[slot] = DISTANCE_ERROR if record.smoothed_mm is None else record.smoothed_mm
+            self.flags[slot] = record_flags(record)
+            self.total = seq + 1
+        return seq
+
+    def _record_at(self, slot):
+        flags = self.flags[slot]
+        zone = _ZONE_BY_CODE[(flags & FLAG_ZONE_MASK) >> FLAG_ZONE_SHIFT]
+        smoothed = self.smoothed[slot]
+        if smoothed == DISTANCE_ERROR:
+            smoothed = None
+        if flags & FLAG_ERROR:
+            return DistanceRecord(self.arrivals[slot], None, True, smoothed, zone)
+        return DistanceRecord(self.arrivals[slot], self.distances[slot], False, smoothed, zone)
+
+    def record(self, seq):
+        """Return the record with sequence number ``seq``."""
+        with self.lock:
+            if not self.first_seq <= seq < self.total:
+                raise IndexError(f"sequence {seq} is not in history")
+            return self._record_at(seq % self.capacity)
+
+    def records(self, start_seq, end_seq=None):
+        """Return ``(seq, record)`` pairs for ``start_seq <= seq < end_seq``, clamped to what is held."""
+        with self.lock:
+            start = max(start_seq, self.first_seq)
+            end = self.total if end_seq is None else min(end_seq, self.total)
+            return [(seq, self._record_at(seq % self.capacity)) for seq in range(start, end)]
+
+    def _seq_at(self, arrival, lo, hi):
+        while lo < hi:
+            middle = (lo + hi) // 2
+            if self.arrivals[middle % self.capacity] < arrival:
+                lo = middle + 1
+            else:
+                hi = middle
+        return lo
+
+    def seq_at(self, arrival):
+        """Sequence number of the first record held that arrived at or after ``arrival``."""
+        with self.lock:
+            return self._seq_at(arrival, self.first_seq, self.total)
+
+    def sample(self, start_seq, end_seq, interval, limit):
+        """First record of every ``interval`` seconds from ``start_seq``, at most ``limit`` of them.
+
+        Returns ``([(seq, record)], next_seq)``; each step is one binary search,
+        so the cost depends on ``limit`` rather than on the span covered.
+        """
+        with self.lock:
+            seq = max(start_seq, self.first_seq)
+            end = min(end_seq, self.total)
+            sampled = []
+            while seq < end and len(sampled) < limit:
+                record = self._record_at(seq % self.capacity)
+                sampled.append((seq, record))
+                seq = self._seq_at(record.arrival + interval, seq + 1, end)
+            return sampled, seq
+
+    def latest(self, count):
+        """Return the most recent ``count`` records as ``(seq, record)`` pairs, oldest first."""
+        return self.records(self.total - count)
+
+    def columns(self, start_seq, end_seq=None):
+        """Copy out ``(arrivals, distances, smoothed, flags)`` arrays for a sequence range."""
+        with self.lock:
+            start = max(start_seq, self.first_seq)
+            end = self.total if end_seq is None else min(end_seq, self.total)
+            arrivals, distances, smoothed, flags = array('d'), array('H'), array('H'), array('B')
+            if end <= start:
+                return arrivals, distances, smoothed, flags
+            first, last = start % self.capacity, (end - 1) % self.capacity
+            if first <= last:
+                spans = [(first, last + 1)]
+            else:
+                spans = [(first, self.capacity), (0, last + 1)]
+            for lo, hi in spans:
+                arrivals.extend(self.arrivals[lo:hi])
+                distances.extend(self.distances[lo:hi])
+                smoothed.extend(self.smoothed[lo:hi])
+                flags.extend(self.flags[lo:hi])
+            return arrivals, distances, smoothed, flags
@@ -0,0 +1,152 @@
+import heapq
+import threading
+from array import array
+from bisect import bisect_left
+
+# --- Line Index ---
+# Every received line (readings, ERROR lines, boot messages, undecodable
+# <BIN:...> lines) in a ring of line numbers, searchable by text or regex
+# without rescanning the logs. Serial output is highly repetitive: the firmware
+# only ever prints a few thousand distinct lines. So every distinct text is
+# stored once, with a posting list of the line numbers where it occurred
+# (array of int64).
+#
+# A query is matched against the distinct texts only (a case-insensitive
+# substring test or a regex, run once per distinct text rather than once per
+# line), then the posting lists of the matching texts are merged in line order.
+# Per line the cost is 20 bytes: its time and text ID in the ring, and one
+# posting entry. Postings of lines that left the ring are dropped
+# TRIMS_PER_RING times per ring's worth of lines, and so are texts that no line
+# in the ring uses any more (their IDs are reused), so unique junk from a noisy
+# link does not pile up.
+LINE_INDEX_CAPACITY = 1_000_000  # lines kept per sensor (~20 MB; 2.8 h at 100 lines/s)
+TRIMS_PER_RING = 8
+SEARCH_PAGE_SIZE = 100
+SEARCH_PAGE_LIMIT = 1000
+SEARCH_CONTEXT_LIMIT = 20  # lines of context either side of a match
+
+class LineIndex:
+    """Ring of received lines with posting lists over their distinct texts.
+
+    Lines are numbered from 0 at start-up; the last ``capacity`` are kept.
+    Arrival stamps are monotonic, so the ring is also a time index.
+    """
+
+    def __init__(self, capacity=LINE_INDEX_CAPACITY):
+        self.capacity = capacity
+        self.arrivals = array('d', bytes(8 * capacity))
+        self.text_ids = array('I', bytes(4 * capacity))
+        self.texts = []       # text ID -> text
+        self.folded = []      # text ID -> lower-cased text, for substring queries
+        self.text_id = {}     # text -> text ID
+        self.postings = []    # text ID -> line numbers, ascending
+        self.free_ids = []    # IDs of dropped texts, to be reused
+        self.trim_interval = max(1, capacity // TRIMS_PER_RING)
+        self.total = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return min(self.total, self.capacity)
+
+    @property
+    def first_line(self):
+        return max(0, self.total - self.capacity)
+
+    def append(self, arrival, text):
+        """Index one line; returns its line number."""
+        with self.lock:
+            text_id = self.text_id.get(text)
+            if text_id is None:
+                if self.free_ids:
+                    text_id = self.free_ids.pop()
+                    self.texts[text_id] = text
+                    self.folded[text_id] = text.lower()
+                else:
+                    text_id = len(self.texts)
+                    self.texts.append(text)
+                    self.folded.append(text.lower())
+                    self.postings.append(array('q'))
+                self.text_id[text] = text_id
+            line = self.total
+            slot = line % self.capacity
+            self.arrivals[slot] = arrival
+            self.text_ids[slot] = text_id
+            self.postings[text_id].append(line)
+            self.total = line + 1
+            if self.total % self.trim_interval == 0:
+                self._trim()
+        return line
+
+    def _trim(self):
+        # Drop postings that point below the ring, and texts left without any; amortised over
+        # ``trim_interval`` appends
+        first = self.first_line
+        for text_id, posting in enumerate(self.postings):
+            if posting and posting[0] < first:
+                del posting[:bisect_left(posting, first)]
+                if not posting:
+                    del self.text_id[self.texts[text_id]]
+                    self.texts[text_id] = self.folded[text_id] = None
+                    self.postings[text_id] = array('q')
+                    self.free_ids.append(text_id)
+
+    def _line_at(self, arrival, lo, hi):
+        while lo < hi:
+            middle = (lo + hi) // 2
+            if self.arrivals[middle % self.capacity] < arrival:
+                lo = middle + 1
+            else:
+                hi = middle
+        return lo
+
+    def line_at(self, arrival):
+        """Number of the first line held that arrived at or after ``arrival``."""
+        with self.lock:
+            return self._line_at(arrival, self.first_line, self.total)
+
+    def matching_texts(self, text=None, pattern=None):
+        """``(text ID, text)`` of the distinct texts containing ``text`` (case-insensitive) and matching ``pattern``."""
+        # Only the copy is made under the lock, so a long scan never holds up append(); search()
+        # skips IDs reused meanwhile
+        with self.lock:
+            texts = list(self.texts)
+            folded = list(self.folded) if text else None
+        if text:
+            needle = text.lower()
+            candidates = [(text_id, texts[text_id]) for text_id, lowered in enumerate(folded)
+                          if lowered is not None and needle in lowered]
+        else:
+            candidates = [(text_id, text) for text_id, text in enumerate(texts) if text is not None]
+        if pattern is not None:
+            candidates = [(text_id, text) for text_id, text in candidates if pattern.search(text)]
+        return candidates
+
+    def search(self, texts, start_line, end_line, limit):
+        """Line numbers of ``texts`` (from ``matching_texts()``) in ``[start_line, end_line)``, at most ``limit``.
+
+        Returns ``(lines, total)`` where ``total`` counts every match in the range.
+        """
+        with self.lock:
+            start_line = max(start_line, self.first_line)
+            end_line = min(end_line, self.total)
+            runs = []
+            total = 0
+            for text_id, text in texts:
+                if self.texts[text_id] is not text:
+                    continue  # dropped and the ID reused since
+                posting = self.postings[text_id]
+                lo = bisect_left(posting, start_line)
+                hi = bisect_left(posting, end_line, lo)
+                if hi > lo:
+                    total += hi - lo
+                    runs.append(posting[lo:min(hi, lo + limit)])
+        lines = list(heapq.merge(*runs))[:limit]
+        return lines, total
+
+    def lines(self, start_line, end_line):
+        """``(line, arrival, text)`` for the lines held in ``[start_line, end_line)``."""
+        with self.lock:
+            start_line = max(start_line, self.first_line)
+            end_line = min(end_line, self.total)
+            return [(line, self.arrivals[line % self.capacity], self.texts[self.text_ids[line % self.capacity]])
+                    for line in range(start_line, end_line)]
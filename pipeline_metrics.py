@@ -0,0 +1,124 @@
+import threading
+import time
+from bisect import bisect_left
+
+# --- Pipeline Metrics ---
+# Histograms of where time goes between a byte arriving on the serial port and
+# its frame leaving for a client, exported in the Prometheus text format on
+# /metrics. Observing a value is a bisect and two additions under an
+# uncontended lock.
+#
+#   read            ser.read() calls that had data waiting (blocking waits excluded)
+#   decode          bytes -> text
+#   parse           parse, filter and zone classification
+#   store           history, aggregates, line index, zone stream, recorder and logger hand-off
+#   fanout_encode   encoding every stream format and queueing it to subscribers
+#   client_send     writing frames to one client (includes waiting on a slow socket)
+#   log_write       one CSV batch write + flush
+#   record_write    one binary recording batch write + flush
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS = (1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4,
+                   1e-3, 2.5e-3, 5e-3, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in labels.items()) + "}"
+
+
+class Histogram:
+    """One labelled series of a histogram family."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def time(self, started):
+        """Observe the time since ``started`` (a ``time.perf_counter()`` value) and return now."""
+        now = time.perf_counter()
+        self.observe(now - started)
+        return now
+
+
+class HistogramFamily:
+    """Histograms sharing a name, one per label value."""
+
+    type = 'histogram'
+
+    def __init__(self, name, help_text, label, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.buckets = buckets
+        self.children = {}
+        self.lock = threading.Lock()
+
+    def labels(self, value):
+        child = self.children.get(value)
+        if child is None:
+            with self.lock:
+                child = self.children.setdefault(value, Histogram(self.buckets))
+        return child
+
+    def samples(self):
+        for value, child in list(self.children.items()):
+            with child.lock:
+                counts, total = list(child.counts), child.sum
+            labels = {self.label: value}
+            cumulative = 0
+            for bound, count in zip(child.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float('inf') else f"{bound:g}"
+                yield "_bucket", dict(labels, le=le), cumulative
+            yield "_sum", labels, total
+            yield "_count", labels, cumulative
+
+
+class Sampled:
+    """Counter or gauge whose values are read at scrape time from ``collect()``.
+
+    ``collect`` returns ``[(labels, value)]``.
+    """
+
+    def __init__(self, name, help_text, collect, type='gauge'):
+        self.name = name
+        self.help_text = help_text
+        self.collect = collect
+        self.type = type
+
+    def samples(self):
+        for labels, value in self.collect():
+            yield "", labels, value
+
+
+STAGE_SECONDS = HistogramFamily('vl53_stage_seconds', "Time spent per pipeline stage", 'stage')
+REGISTRY = [STAGE_SECONDS]
+
+
+def stage(name):
+    return STAGE_SECONDS.labels(name)
+
+
+def register(metric):
+    REGISTRY.append(metric)
+    return metric
+
+
+def render(metrics=None):
+    """Prometheus text exposition of ``metrics`` (default: everything registered)."""
+    lines = []
+    for metric in REGISTRY if metrics is None else metrics:
+        lines.append(f"# HELP {metric.name} {metric.help_text}")
+        lines.append(f"# TYPE {metric.name} {metric.type}")
+        for suffix, labels, value in metric.samples():
+            lines.append(f"{metric.name}{suffix}{format_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
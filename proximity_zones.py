@@ -0,0 +1,82 @@
+# --- Proximity Zones ---
+# Same bands as the firmware main() loop in I2C_Vl52l0x_UART.c:
+#   MIN_VALID_MM < d < DANGER_MM   danger  (red LED, fast buzzer)
+#   DANGER_MM <= d < WARNING_MM    warning (yellow LED, slow buzzer)
+#   d >= WARNING_MM                safe    (green LED)
+# The firmware also shows green for d <= MIN_VALID_MM; here such readings, like
+# "distance: ERROR", are treated as invalid and simply hold the current zone.
+ZONE_SAFE = 'safe'
+ZONE_WARNING = 'warning'
+ZONE_DANGER = 'danger'
+ZONES = (ZONE_SAFE, ZONE_WARNING, ZONE_DANGER)
+
+MIN_VALID_MM = 20
+DANGER_MM = 150
+WARNING_MM = 400
+HYSTERESIS_MM = 10  # a boundary must be crossed by this much to leave a zone
+DEBOUNCE_SAMPLES = 3  # consecutive readings needed to confirm a new zone
+
+ZONE_HISTORY_SIZE = 1000  # recent transitions kept for /zones replay (see sensor_channel.ZoneStream)
+
+
+class ZoneClassifier:
+    """Per-reading zone classification with hysteresis and N-sample debounce."""
+
+    def __init__(self, min_valid_mm=MIN_VALID_MM, danger_mm=DANGER_MM, warning_mm=WARNING_MM,
+                 hysteresis_mm=HYSTERESIS_MM, debounce=DEBOUNCE_SAMPLES):
+        self.min_valid_mm = min_valid_mm
+        self.danger_mm = danger_mm
+        self.warning_mm = warning_mm
+        self.hysteresis_mm = hysteresis_mm
+        self.debounce = max(1, debounce)
+        self.zone = None
+        self.candidate = None
+        self.candidate_count = 0
+
+    def classify(self, distance):
+        """Zone for ``distance`` given the current zone, with the hysteresis bands applied."""
+        # Edges move away from the current zone, so it takes a clear crossing to leave it
+        hysteresis = self.hysteresis_mm
+        danger_edge = self.danger_mm + (hysteresis if self.zone == ZONE_DANGER else -hysteresis)
+        warning_edge = self.warning_mm + (hysteresis if self.zone != ZONE_SAFE else -hysteresis)
+        if self.zone is None:
+            danger_edge, warning_edge = self.danger_mm, self.warning_mm
+        if distance < danger_edge:
+            return ZONE_DANGER
+        if distance < warning_edge:
+            return ZONE_WARNING
+        return ZONE_SAFE
+
+    def update(self, record):
+        """Classify one reading; returns ``(zone, transition)`` where transition is None or a dict.
+
+        The smoothed distance is used when the record has one.
+        """
+        if record.error:
+            return self.zone, None
+        distance = record.distance_mm if record.smoothed_mm is None else record.smoothed_mm
+        if distance <= self.min_valid_mm:
+            return self.zone, None
+
+        zone = self.classify(distance)
+        if zone == self.zone:
+            self.candidate, self.candidate_count = None, 0
+            return self.zone, None
+
+        if zone == self.candidate:
+            self.candidate_count += 1
+        else:
+            self.candidate, self.candidate_count = zone, 1
+        # The very first valid reading sets the zone without waiting
+        if self.zone is not None and self.candidate_count < self.debounce:
+            return self.zone, None
+
+        transition = {
+            "from": self.zone,
+            "to": zone,
+            "distance_mm": distance,
+            "arrival": record.arrival,
+        }
+        self.zone = zone
+        self.candidate, self.candidate_count = None, 0
+        return zone, transition
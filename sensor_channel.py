@@ -0,0 +1,556 @@
+import asyncio
+import json
+import re
+import threading
+import time
+from collections import deque, namedtuple
+from datetime import datetime
+
+import pipeline_metrics
+from distance_filters import make_filter
+from distance_pyramid import AGGREGATE_POINTS, PYRAMID_LEVELS, DistancePyramid
+from distance_recording import BinaryRecorder, record_row
+from distance_store import DistanceHistory, format_distance, parse_distance
+from line_index import LINE_INDEX_CAPACITY, SEARCH_CONTEXT_LIMIT, SEARCH_PAGE_LIMIT, SEARCH_PAGE_SIZE, LineIndex
+from proximity_zones import ZONE_HISTORY_SIZE, ZoneClassifier
+from sequence_tracker import EMPTY_LINK_COUNTS, SequenceTracker, is_corrupt
+from serial_ingest import FRAME_SIZE, FirmwareFrame, FrameDecoder, arrival_at, frame_record, read_lines, wall_clock
+from serial_sources import open_source
+from stream_broadcast import REPLAY_LIMIT, Broadcaster, format_sse
+from stream_encoding import encoded_streams
+from stream_stats import EMPTY_RATES, STATS_WINDOWS, StreamStats, window_label
+
+# --- Sensor Configuration ---
+RECONNECT_DELAY = 3.0  # seconds between attempts to reopen a failed port
+ECHO_INTERVAL = 1.0  # seconds between [SERIAL] console lines per sensor; 0 echoes every line
+HEADLINE_WINDOW = window_label(STATS_WINDOWS[0])  # window behind the rates in every stream frame
+HISTORY_PAGE_SIZE = 1000  # readings per /history page unless ?limit= asks for fewer or more
+HISTORY_PAGE_LIMIT = 10000
+
+# Everything clients see about a channel, replaced as a whole by the reader.
+# Readers take ``channel.state`` once and use only that object, so a count is
+# never shown next to the text of a different message. Rebinding the attribute
+# is atomic, so neither side takes a lock.
+SensorState = namedtuple('SensorState', 'latest_data connection_status message_count total_bytes rates zone link')
+INITIAL_STATE = SensorState("No data yet", "Disconnected", 0, 0, {}, None, EMPTY_LINK_COUNTS)
+
+
+def parse_port_list(spec):
+    """Parse ``"front=COM7,rear=COM8"`` (or just ``"COM7,COM8"``) into ``[(sensor_id, port)]``.
+
+    Raises ValueError if a sensor ID appears twice.
+    """
+    sensors = []
+    for index, entry in enumerate(part.strip() for part in spec.split(',')):
+        if not entry:
+            continue
+        sensor_id, separator, port = entry.partition('=')
+        # "sim://?rate=50" has an '=' too, but no sensor ID in front of it
+        if not separator or not sensor_id.strip().isidentifier():
+            sensor_id, port = f"sensor{index + 1}", entry
+        sensor_id = sensor_id.strip()
+        if any(sensor_id == other for other, _ in sensors):
+            raise ValueError(f"sensor ID {sensor_id!r} is used twice in {spec!r}")
+        sensors.append((sensor_id, port.strip()))
+    return sensors
+
+
+def timestamp_iso(arrival):
+    return datetime.fromtimestamp(wall_clock(arrival)).isoformat()
+
+
+def parse_timestamp(text):
+    """Unix seconds (``1718000000.5``) or local ISO 8601 time (``2024-06-10T08:13:20``) to Unix seconds."""
+    try:
+        return float(text)
+    except ValueError:
+        return datetime.fromisoformat(text).timestamp()
+
+
+DECODE_TIME = pipeline_metrics.stage('decode')
+PARSE_TIME = pipeline_metrics.stage('parse')
+STORE_TIME = pipeline_metrics.stage('store')
+FANOUT_TIME = pipeline_metrics.stage('fanout_encode')
+READ_TIME = pipeline_metrics.stage('read')
+
+
+class ZoneStream:
+    """Zone transitions from every sensor, numbered in one sequence and fanned out on /zones."""
+
+    def __init__(self, size=ZONE_HISTORY_SIZE):
+        self.transitions = deque(maxlen=size)
+        self.count = 0
+        self.broadcaster = Broadcaster()
+        self.lock = threading.Lock()
+
+    def encode(self, transition):
+        data = {
+            "seq": transition["seq"],
+            "sensor": transition["sensor"],
+            "from": transition["from"],
+            "to": transition["to"],
+            "distance_mm": transition["distance_mm"],
+            "timestamp": timestamp_iso(transition["arrival"])
+        }
+        return format_sse(json.dumps(data), event_id=self.broadcaster.event_id(transition["seq"]))
+
+    def publish(self, sensor_id, transition):
+        # Numbering and publishing under one lock keeps the stream in sequence order
+        with self.lock:
+            transition = dict(transition, seq=self.count, sensor=sensor_id)
+            self.count += 1
+            self.transitions.append(transition)
+            self.broadcaster.publish(self.encode(transition), transition["seq"])
+        return transition
+
+    def replay(self, start_seq):
+        with self.lock:
+            transitions = [transition for transition in self.transitions if transition["seq"] >= start_seq]
+        for transition in transitions:
+            yield transition["seq"], self.encode(transition)
+
+    def stream(self, last_event_id=None):
+        return self.broadcaster.stream(last_event_id, self.replay)
+
+
+class SensorChannel:
+    """One sensor: its port, reader thread, pipeline stages, history, stats and subscribers.
+
+    In the threaded server every channel owns a blocking reader thread, so N
+    sensors cost N mostly idle threads in one process rather than N server
+    processes; the asyncio server instead runs ``run_async()`` on its event loop. The CSV logger and
+    zone stream are shared between channels; rows and transitions are tagged
+    with the sensor ID.
+    """
+
+    def __init__(self, sensor_id, port, baudrate, read_timeout=1.0, history_capacity=1_000_000,
+                 filter_spec='none', zone_settings=None, data_logger=None, zone_stream=None,
+                 echo_interval=ECHO_INTERVAL, line_capacity=LINE_INDEX_CAPACITY, pyramid_levels=PYRAMID_LEVELS):
+        self.sensor_id = sensor_id
+        self.port = port
+        self.baudrate = baudrate
+        self.read_timeout = read_timeout
+        self.history = DistanceHistory(history_capacity)
+        self.pyramid = DistancePyramid(pyramid_levels)
+        # Text lines and binary frames, detected per item; one per connection
+        self.decoder = FrameDecoder()
+        # Gaps, duplicates, late arrivals and corrupt lines (see sequence_tracker.py)
+        self.sequence = SequenceTracker()
+        # Every line as received, for /search
+        self.lines = LineIndex(line_capacity)
+        self.distance_filter = make_filter(filter_spec)
+        self.zone_classifier = ZoneClassifier(**(zone_settings or {}))
+        self.broadcaster = Broadcaster()
+        # Compact SSE and WebSocket encodings, by format name (see stream_encoding.py)
+        self.encoded = encoded_streams(sensor_id)
+        self.recorder = BinaryRecorder(prefix=f"distance_rec_{sensor_id}")
+        self.data_logger = data_logger
+        self.zone_stream = zone_stream
+        # Printing every line costs throughput, so the console echo is sampled (None = off)
+        self.echo_interval = echo_interval
+        self.echo_time = None
+        self.echo_skipped = 0
+
+        self.state = INITIAL_STATE
+        self.stream_stats = StreamStats()
+
+    def start(self):
+        threading.Thread(target=self.run, name=f"reader-{self.sensor_id}", daemon=True).start()
+
+    # --- Stats ---
+    def stats(self, state=None):
+        state = state or self.state
+        rates = state.rates.get(HEADLINE_WINDOW, EMPTY_RATES)
+        return {
+            "message_count": state.message_count,
+            "total_bytes": state.total_bytes,
+            "avg_message_size": state.total_bytes / max(state.message_count, 1),
+            "message_rate": rates["message_rate"],
+            "data_rate": rates["data_rate"],
+            "error_rate": rates["error_rate"],
+            "jitter_ms": rates["jitter_ms"],
+            "gaps": state.link.gaps,
+            "missing": state.link.missing,
+            "duplicates": state.link.duplicates,
+            "late": state.link.late,
+            "restarts": state.link.restarts,
+            "corrupt": state.link.corrupt
+        }
+
+    def summary(self):
+        """Port, status, zone and stats for the /sensors listing."""
+        state = self.state
+        return {
+            "sensor": self.sensor_id,
+            "port": self.port,
+            "status": state.connection_status,
+            "zone": state.zone,
+            "protocol": self.decoder.mode,
+            "stats": self.stats(state),
+            "windows": state.rates
+        }
+
+    # --- Stream Publishing ---
+    def publish_update(self, timestamp, seq=None, record=None):
+        """Encode the current state once per format and push the same frame to every subscriber."""
+        state = self.state
+        stats = self.stats(state)
+        for encoded in self.encoded.values():
+            # An encoding nobody is listening to costs nothing and restarts with a key frame
+            if encoded.active:
+                encoded.publish(seq, record, state, timestamp.timestamp(), stats)
+            else:
+                encoded.skip(seq)
+
+        data = {
+            "sensor": self.sensor_id,
+            "message": state.latest_data,
+            "timestamp": timestamp.isoformat(),
+            "status": state.connection_status,
+            "stats": stats
+        }
+        if record is None:
+            self.broadcaster.publish(format_sse(json.dumps(data)))
+            return
+        data["seq"] = seq
+        data["distance_mm"] = record.distance_mm
+        data["error"] = record.error
+        data["smoothed_mm"] = record.smoothed_mm
+        data["zone"] = record.zone
+        self.broadcaster.publish(format_sse(json.dumps(data), event_id=self.broadcaster.event_id(seq)), seq)
+
+    def publish_stats(self, timestamp):
+        """Push the current stats without a message (``event: stats``, not retained)."""
+        state = self.state
+        stats = self.stats(state)
+        for encoded in self.encoded.values():
+            if encoded.active:
+                encoded.publish_stats(timestamp.timestamp(), state, stats)
+        data = {"sensor": self.sensor_id, "timestamp": timestamp.isoformat(), "status": state.connection_status,
+                "stats": stats}
+        self.broadcaster.publish(format_sse(json.dumps(data), event="stats"), retain=False)
+
+    def reading_data(self, seq, record):
+        return {
+            "sensor": self.sensor_id,
+            "message": format_distance(record),
+            "timestamp": timestamp_iso(record.arrival),
+            "seq": seq,
+            "distance_mm": record.distance_mm,
+            "error": record.error,
+            "smoothed_mm": record.smoothed_mm,
+            "zone": record.zone
+        }
+
+    def replay_readings(self, start_seq):
+        """Re-encode readings from history for a client resuming at ``start_seq``."""
+        start_seq = max(start_seq, self.history.total - REPLAY_LIMIT)
+        for seq, record in self.history.records(start_seq):
+            data = self.reading_data(seq, record)
+            yield seq, format_sse(json.dumps(data), event_id=self.broadcaster.event_id(seq))
+
+    # --- History Queries ---
+    def history_page(self, start=None, end=None, limit=HISTORY_PAGE_SIZE, cursor=None, downsample=None):
+        """One page of stored readings with ``start <= time < end`` (Unix seconds, both optional).
+
+        Both ends are located by binary search over the arrival stamps, and only
+        the page itself is copied out of the ring. ``downsample`` keeps the first
+        reading of every that many seconds. Pass the returned ``next_cursor``
+        back as ``cursor`` for the following page; it is None on the last page.
+        """
+        history = self.history
+        limit = max(1, min(limit, HISTORY_PAGE_LIMIT))
+        start_seq = history.first_seq if start is None else history.seq_at(arrival_at(start))
+        end_seq = history.total if end is None else history.seq_at(arrival_at(end))
+        if cursor is not None:
+            start_seq = max(start_seq, cursor)
+        if downsample:
+            readings, next_seq = history.sample(start_seq, end_seq, downsample, limit)
+        else:
+            readings = history.records(start_seq, min(end_seq, start_seq + limit))
+            next_seq = readings[-1][0] + 1 if readings else end_seq
+        return {
+            "sensor": self.sensor_id,
+            "first_seq": history.first_seq,
+            "count": len(readings),
+            "readings": [self.reading_data(seq, record) for seq, record in readings],
+            "next_cursor": next_seq if next_seq < end_seq else None
+        }
+
+    def aggregates(self, start=None, end=None, points=AGGREGATE_POINTS, resolution=None):
+        """Min/max/mean buckets from the pyramid; defaults to everything held up to now."""
+        end = time.time() if end is None else end
+        if start is None:
+            start = self.pyramid.levels[-1].oldest() or end
+        result = self.pyramid.query(start, end, max(1, points), resolution)
+        result["sensor"] = self.sensor_id
+        return result
+
+    def search(self, text=None, regex=None, start=None, end=None, limit=SEARCH_PAGE_SIZE, cursor=None, context=0):
+        """Received lines containing ``text`` (case-insensitive) and/or matching ``regex``, oldest first.
+
+        ``start``/``end`` (Unix seconds) and the cursor work as in
+        ``history_page()``. Each match carries ``context`` lines either side.
+        """
+        if not text and not regex:
+            raise ValueError("q or regex is required")
+        try:
+            pattern = re.compile(regex) if regex else None
+        except re.error as e:
+            raise ValueError(f"regex: {e}")
+        lines = self.lines
+        limit = max(1, min(limit, SEARCH_PAGE_LIMIT))
+        context = max(0, min(context, SEARCH_CONTEXT_LIMIT))
+        start_line = lines.first_line if start is None else lines.line_at(arrival_at(start))
+        end_line = lines.total if end is None else lines.line_at(arrival_at(end))
+        if cursor is not None:
+            start_line = max(start_line, cursor)
+        found, total = lines.search(lines.matching_texts(text, pattern), start_line, end_line, limit)
+        matches = []
+        for number in found:
+            window = lines.lines(number - context, number + context + 1)
+            line = {"line": number, "timestamp": None, "text": None, "before": [], "after": []}
+            for other, arrival, line_text in window:
+                if other == number:
+                    line.update(timestamp=timestamp_iso(arrival), text=line_text)
+                else:
+                    side = line["before"] if other < number else line["after"]
+                    side.append({"line": other, "timestamp": timestamp_iso(arrival), "text": line_text})
+            matches.append(line)
+        next_line = found[-1] + 1 if len(found) < total else None
+        return {
+            "sensor": self.sensor_id,
+            "first_line": lines.first_line,
+            "total": total,
+            "count": len(matches),
+            "matches": matches,
+            "next_cursor": next_line
+        }
+
+    def replay_compact(self, start_seq):
+        """Compact frames for a client resuming at ``start_seq`` (see CompactSseStream.replay)."""
+        compact = self.encoded["compact"]
+        # Position first: history then holds at least every reading up to it
+        position = compact.position
+        last_seq = position[0]
+        if last_seq is None:
+            return []
+        start_seq = max(start_seq, self.history.total - REPLAY_LIMIT)
+        readings = [(seq, wall_clock(record.arrival), record)
+                    for seq, record in self.history.records(start_seq, last_seq + 1)]
+        state = self.state
+        return compact.replay(start_seq, readings, position, state, self.stats(state))
+
+    def stream(self, last_event_id=None, encoding=None):
+        """SSE generator for the full JSON frames, or for ``encoding`` ("compact"), both resumable."""
+        if encoding is not None:
+            return self.encoded[encoding].broadcaster.stream(last_event_id, self.replay_compact)
+        return self.broadcaster.stream(last_event_id, self.replay_readings)
+
+    # --- Serial Reader ---
+    def ingest(self, arrival, line):
+        """Run one received line or binary frame through the pipeline: parse, smooth, classify, store, log, fan out."""
+        started = time.perf_counter()
+        frame = line if isinstance(line, FirmwareFrame) else None
+        if frame is None:
+            try:
+                data_str = line.decode('utf-8').strip()
+            except UnicodeDecodeError:
+                data_str = f"<BIN:{line.hex()}>"
+            if not data_str:
+                return
+            size = len(line)
+        else:
+            size = FRAME_SIZE
+        started = DECODE_TIME.time(started)
+
+        state = self.state
+        message_count = state.message_count + 1
+        total_bytes = state.total_bytes + size
+        zone = state.zone
+
+        # Store typed readings in history, stamped when the line arrived
+        if frame is None:
+            record = parse_distance(arrival, line)
+            if record is not None:
+                self.sequence.unsequenced(arrival)
+            elif is_corrupt(data_str):
+                self.sequence.corrupt()
+        else:
+            # Logs, search and the dashboard see a frame as the line the text protocol would have sent
+            record = frame_record(arrival, frame)
+            data_str = format_distance(record)
+            self.sequence.sequenced(frame.seq, arrival)
+        seq = None
+        if record is not None:
+            if not record.error:
+                record = record._replace(smoothed_mm=round(self.distance_filter.update(record.distance_mm)))
+            zone, transition = self.zone_classifier.update(record)
+            record = record._replace(zone=zone)
+            started = PARSE_TIME.time(started)
+            seq = self.history.append(record)
+            self.pyramid.add(wall_clock(arrival), record.distance_mm)
+            if transition is not None and self.zone_stream is not None:
+                self.zone_stream.publish(self.sensor_id, transition)
+                print(f"[ZONE] {self.sensor_id}: {transition['from']} -> {transition['to']} "
+                      f"at {transition['distance_mm']} mm")
+            self.recorder.log(*record_row(wall_clock(arrival), record))
+        else:
+            started = PARSE_TIME.time(started)
+
+        # Index the line as received for /search
+        self.lines.append(arrival, data_str)
+
+        # Hand off to the logging stage if enabled; never blocks
+        if self.data_logger is not None:
+            self.data_logger.log(wall_clock(arrival), self.sensor_id, data_str)
+        started = STORE_TIME.time(started)
+
+        # Window totals move on every line; the rates are re-derived once per bucket
+        rates = state.rates
+        if self.stream_stats.add(arrival, size, record is not None and record.error):
+            rates = self.stream_stats.snapshot(arrival)
+        # One new snapshot per line: readers see all of this message or none of it
+        self.state = SensorState(data_str, state.connection_status, message_count, total_bytes, rates, zone,
+                                 self.sequence.counts)
+        self.publish_update(datetime.fromtimestamp(wall_clock(arrival)), seq, record)
+        FANOUT_TIME.time(started)
+        self.echo(arrival, data_str)
+
+    def update_rates(self, now):
+        """Re-derive the rates at ``now`` if a bucket has passed; returns True if they changed.
+
+        ingest() only does this when a line arrives, so without it the rates of
+        a quiet or disconnected sensor would stay at their last values. Called
+        from the reader's side only, like ingest().
+        """
+        if not self.stream_stats.advance(now):
+            return False
+        state = self.state
+        rates = self.stream_stats.snapshot(now)
+        if rates == state.rates:
+            return False
+        self.state = state._replace(rates=rates)
+        return True
+
+    def idle(self, now):
+        """The port had nothing to read for a while: let the rates decay and tell the clients."""
+        if self.update_rates(now):
+            self.publish_stats(datetime.now())
+
+    def echo(self, arrival, data_str):
+        if self.echo_interval is None:
+            return
+        if self.echo_time is not None and arrival - self.echo_time < self.echo_interval:
+            self.echo_skipped += 1
+            return
+        skipped = f" (+{self.echo_skipped} more)" if self.echo_skipped else ""
+        print(f"[SERIAL] {self.sensor_id}: {data_str}{skipped}")
+        self.echo_time = arrival
+        self.echo_skipped = 0
+
+    def connect(self):
+        print(f"[INFO] Attempting to connect to {self.port} ({self.sensor_id})...")
+        # Blocking reads: the timeout only bounds how long read() waits for
+        # the first byte, it is never slept on while data is flowing
+        ser = open_source(self.port, self.baudrate, self.read_timeout)
+        self.decoder = FrameDecoder()
+        # Readings lost while disconnected are not the link's doing
+        self.sequence.reset()
+        self.update_rates(time.monotonic())
+        self.state = self.state._replace(connection_status="Connected")
+        print(f"[INFO] Connected to {self.port} at {self.baudrate} baud ({self.sensor_id})")
+        self.publish_update(datetime.now())
+        return ser
+
+    def connection_failed(self, e):
+        self.update_rates(time.monotonic())
+        if isinstance(e, OSError):
+            # pyserial's SerialException is an OSError
+            print(f"[ERROR] Serial connection failed ({self.sensor_id}): {e}")
+            self.state = self.state._replace(connection_status=f"Serial Error: {str(e)}",
+                                             latest_data="Serial connection error")
+        else:
+            print(f"[ERROR] Unexpected serial error ({self.sensor_id}): {e}")
+            self.state = self.state._replace(connection_status=f"Error: {str(e)}")
+        self.publish_update(datetime.now())
+
+    def run(self):
+        while True:
+            ser = None
+            try:
+                ser = self.connect()
+                for arrival, line in read_lines(ser, self.decoder, self.idle):
+                    self.ingest(arrival, line)
+            except Exception as e:
+                self.connection_failed(e)
+                time.sleep(RECONNECT_DELAY)
+            finally:
+                close_quietly(ser)
+
+    # --- Asyncio Reader ---
+    async def run_async(self):
+        """Reader for the asyncio server: same pipeline, driven by the event loop."""
+        loop = asyncio.get_running_loop()
+        while True:
+            ser = None
+            try:
+                # Opening a port can block (USB enumeration), so keep it off the loop
+                ser = await loop.run_in_executor(None, self.connect)
+                await self.read_async(loop, ser)
+            except Exception as e:
+                self.connection_failed(e)
+                await asyncio.sleep(RECONNECT_DELAY)
+            finally:
+                close_quietly(ser)
+
+    async def read_async(self, loop, ser):
+        """Ingest lines as the port becomes readable; never returns normally.
+
+        Sources with a selectable descriptor (POSIX serial ports, the simulator
+        pty) are watched with ``add_reader`` and drained without blocking.
+        Otherwise (Windows COM ports, the proactor loop) a worker thread runs
+        the blocking reader instead.
+        """
+        try:
+            fd = ser.fileno()
+            failed = loop.create_future()
+            framer = self.decoder
+
+            def on_readable():
+                try:
+                    started = time.perf_counter()
+                    chunk = ser.read(ser.in_waiting or 1)
+                    READ_TIME.time(started)
+                    arrival = time.monotonic()
+                    if not chunk:
+                        raise OSError("device reports readiness to read but returned no data")
+                    for line_arrival, line in framer.feed(chunk, arrival):
+                        self.ingest(line_arrival, line)
+                except Exception as e:
+                    if not failed.done():
+                        failed.set_exception(e)
+
+            loop.add_reader(fd, on_readable)
+        except (AttributeError, OSError, NotImplementedError):
+            await loop.run_in_executor(None, self.read_blocking, ser)
+            return
+        try:
+            while not failed.done():
+                await asyncio.wait([failed], timeout=self.read_timeout)
+                self.idle(time.monotonic())
+            failed.result()
+        finally:
+            loop.remove_reader(fd)
+
+    def read_blocking(self, ser):
+        for arrival, line in read_lines(ser, self.decoder, self.idle):
+            self.ingest(arrival, line)
+
+
+def close_quietly(ser):
+    if ser is not None:
+        try:
+            ser.close()
+        except Exception:
+            pass
@@ -0,0 +1,152 @@
+from collections import namedtuple
+
+# --- Sequence Tracking ---
+# Counts readings that were lost, repeated or delivered out of order on the way
+# from the firmware. Binary frames (see serial_ingest.py) carry a 16-bit
+# sequence number, which makes this exact: the last SEQUENCE_WINDOW numbers are
+# remembered as received or missing, so a number seen twice is a duplicate and
+# a missing one turning up is a late arrival. A jump back past the window, or
+# forward further than the time since the last frame could explain, is a
+# firmware restart rather than a gap.
+#
+# Text lines carry no sequence number, so for them a gap is inferred from the
+# cadence (a moving average of the time between readings): a silence longer
+# than CADENCE_GAP_FACTOR readings, and at least CADENCE_MIN_GAP since USB
+# serial adapters deliver lines in bursts, counts as a gap of as many readings
+# as would have fit. Duplicates and late arrivals cannot be told from normal
+# readings there.
+#
+#   gaps        times one or more readings went missing
+#   missing     readings that never arrived (late ones are taken back off)
+#   duplicates  sequence numbers received again
+#   late        readings that arrived after a later one
+#   restarts    times the sequence started over
+#   corrupt     lines that were neither a reading nor printable text (<BIN:...>, broken frames)
+SEQUENCE_MODULUS = 0x10000
+SEQUENCE_WINDOW = 1024  # recent sequence numbers remembered for duplicate and late detection
+CADENCE_ALPHA = 0.05
+CADENCE_WARMUP = 20  # intervals averaged before text gaps are inferred
+CADENCE_GAP_FACTOR = 3.0
+CADENCE_MIN_GAP = 0.05  # seconds
+RESTART_FACTOR = 4  # a forward jump this many times what the elapsed time explains is a restart
+RESTART_SLACK = 64
+
+LinkCounts = namedtuple('LinkCounts', 'gaps missing duplicates late restarts corrupt')
+EMPTY_LINK_COUNTS = LinkCounts(0, 0, 0, 0, 0, 0)
+
+UNSEEN, RECEIVED, MISSING = 0, 1, 2
+
+
+def is_corrupt(data_str):
+    """True for a line that is neither decodable nor printable, i.e. damaged in transit."""
+    return data_str.startswith("<BIN:") or not data_str.isprintable()
+
+
+class SequenceTracker:
+    """Gap, duplicate and late-arrival counts for one sensor's readings.
+
+    ``counts`` is a LinkCounts that is replaced whenever a count changes, so it
+    can go into a state snapshot as it is.
+    """
+
+    def __init__(self, window=SEQUENCE_WINDOW):
+        self.window = window
+        self.marks = bytearray(SEQUENCE_MODULUS)  # per sequence number: UNSEEN, RECEIVED or MISSING
+        self.counts = EMPTY_LINK_COUNTS
+        self.cadence = None
+        self.intervals = 0
+        self.reset()
+
+    def reset(self):
+        """Forget the stream position, e.g. on reconnect; counts and cadence are kept."""
+        self.expected = None
+        self.last_arrival = None
+        self.marks[:] = bytes(SEQUENCE_MODULUS)
+
+    def add(self, **changes):
+        self.counts = self.counts._replace(**{name: getattr(self.counts, name) + value
+                                              for name, value in changes.items()})
+
+    def observe(self, interval):
+        if self.cadence is None:
+            self.cadence = interval
+        else:
+            self.cadence += CADENCE_ALPHA * (interval - self.cadence)
+        self.intervals += 1
+
+    def corrupt(self):
+        self.add(corrupt=1)
+
+    def sequenced(self, seq, arrival):
+        """Account for reading ``seq``."""
+        marks = self.marks
+        if self.expected is None:
+            self.restart(seq, arrival)
+            return
+        if seq == self.expected:
+            # The common case: slide the window by one
+            marks[(seq - self.window) % SEQUENCE_MODULUS] = UNSEEN
+            marks[seq] = RECEIVED
+            self.observe(arrival - self.last_arrival)
+            self.expected = (seq + 1) % SEQUENCE_MODULUS
+            self.last_arrival = arrival
+            return
+        ahead = (seq - self.expected) % SEQUENCE_MODULUS
+        if ahead < SEQUENCE_MODULUS // 2:
+            elapsed = arrival - self.last_arrival
+            if ahead and self.cadence and ahead > RESTART_FACTOR * elapsed / self.cadence + RESTART_SLACK:
+                self.add(restarts=1)
+                self.restart(seq, arrival)
+                return
+            steps = ahead + 1
+            # Slide the window up to ``seq``, clearing the marks that leave it
+            bottom = self.expected - self.window
+            for offset in range(min(steps, self.window)):
+                marks[(bottom + offset) % SEQUENCE_MODULUS] = UNSEEN
+            if ahead:
+                self.add(gaps=1, missing=ahead)
+                for offset in range(1, min(ahead, self.window - 1) + 1):
+                    marks[(seq - offset) % SEQUENCE_MODULUS] = MISSING
+            marks[seq] = RECEIVED
+            self.observe(elapsed / steps)
+            self.expected = (seq + 1) % SEQUENCE_MODULUS
+            self.last_arrival = arrival
+            return
+
+        behind = (self.expected - 1 - seq) % SEQUENCE_MODULUS
+        if behind >= self.window:
+            self.add(restarts=1)
+            self.restart(seq, arrival)
+            return
+        mark = marks[seq]
+        if mark == RECEIVED:
+            self.add(duplicates=1)
+            return
+        if mark == MISSING:
+            self.add(late=1, missing=-1)
+        else:
+            # Older than the first reading since (re)connecting
+            self.add(late=1)
+        marks[seq] = RECEIVED
+
+    def restart(self, seq, arrival):
+        self.reset()
+        self.marks[seq] = RECEIVED
+        self.expected = (seq + 1) % SEQUENCE_MODULUS
+        self.last_arrival = arrival
+
+    def unsequenced(self, arrival):
+        """Account for a reading without a sequence number, from its arrival time alone."""
+        if self.last_arrival is not None:
+            elapsed = arrival - self.last_arrival
+            if self.intervals < CADENCE_WARMUP:
+                self.observe(elapsed)
+            elif self.cadence > 0 and elapsed > max(CADENCE_GAP_FACTOR * self.cadence, CADENCE_MIN_GAP):
+                missing = round(elapsed / self.cadence) - 1
+                if missing > 0:
+                    self.add(gaps=1, missing=missing)
+                # Capped, so one outage does not skew the cadence, while a slower firmware loop soon becomes the norm
+                self.observe(min(elapsed, CADENCE_GAP_FACTOR * self.cadence))
+            else:
+                self.observe(elapsed)
+        self.last_arrival = arrival
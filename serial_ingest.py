@@ -0,0 +1,204 @@
+import struct
+import time
+from collections import namedtuple
+
+import pipeline_metrics
+from distance_store import DISTANCE_ERROR, DistanceRecord
+
+# --- Line Framing ---
+# The firmware terminates every record with "\r\n" (see uart_send_distance()
+# in I2C_Vl52l0x_UART.c). Bytes are accumulated in a persistent buffer and only
+# complete lines are handed on, so a record is never split or merged no matter
+# how the UART chunks arrive.
+LINE_TERMINATOR = b"\n"
+MAX_LINE_LENGTH = 1024
+
+# Arrival stamps use the monotonic clock; this offset maps them back to wall time
+_WALL_CLOCK_OFFSET = time.time() - time.monotonic()
+
+
+def wall_clock(arrival):
+    """Convert a monotonic arrival stamp to a Unix timestamp."""
+    return arrival + _WALL_CLOCK_OFFSET
+
+
+def arrival_at(timestamp):
+    """Convert a Unix timestamp to the monotonic clock used for arrival stamps."""
+    return timestamp - _WALL_CLOCK_OFFSET
+
+
+class LineFramer:
+    """Incremental "\\r\\n" framer fed with raw chunks of serial bytes."""
+
+    def __init__(self, max_line_length=MAX_LINE_LENGTH):
+        self.buffer = bytearray()
+        self.max_line_length = max_line_length
+
+    def feed(self, chunk, arrival):
+        """Append ``chunk`` and return ``(arrival, line)`` for every completed line."""
+        buffer = self.buffer
+        buffer += chunk
+        lines = []
+        start = 0
+        while True:
+            end = buffer.find(LINE_TERMINATOR, start)
+            if end < 0:
+                break
+            line = bytes(buffer[start:end]).rstrip(b"\r")
+            if line:
+                lines.append((arrival, line))
+            start = end + 1
+        if start:
+            del buffer[:start]
+
+        # A run of garbage with no terminator must not grow the buffer forever
+        if len(buffer) > self.max_line_length:
+            lines.append((arrival, bytes(buffer)))
+            buffer.clear()
+        return lines
+
+
+# --- Binary Frames ---
+# With UART_BINARY_FRAMES set, the firmware sends each reading as a 7-byte
+# frame instead of a ~17-byte "distance: N mm\r\n" line (uart_send_frame() in
+# I2C_Vl52l0x_UART.c):
+#
+#   0    0xA5       sync; never appears in the firmware's ASCII text
+#   1-2  seq        uint16, little-endian, wraps
+#   3-4  distance   uint16 mm, 0xFFFF = ERROR
+#   5    status     bit 0: I2C read failed
+#   6    crc        CRC-8 (poly 0x07, init 0) of bytes 1-5
+#
+# Text (e.g. the start-up banner) and frames may be mixed on one link, so the
+# decoder needs no mode switch. A sync byte starts a frame only if the CRC
+# matches; otherwise it is taken as part of a text line, and whatever sits
+# between a broken frame and the next good one is passed on as a line of its
+# own, just like any other garbage.
+FRAME_SYNC = 0xA5
+FRAME = struct.Struct('<BHHBB')
+FRAME_SIZE = FRAME.size
+_FRAME_BYTES = struct.Struct('7B')
+FRAME_STATUS_ERROR = 0x01
+
+FirmwareFrame = namedtuple('FirmwareFrame', ['seq', 'distance_mm', 'status'])
+
+
+def _crc8_table():
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x07) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+        table.append(crc)
+    return bytes(table)
+
+
+_CRC8_TABLE = _crc8_table()
+
+
+def crc8(data):
+    crc = 0
+    for byte in data:
+        crc = _CRC8_TABLE[crc ^ byte]
+    return crc
+
+
+def pack_frame(seq, distance, status=None):
+    """The bytes uart_send_frame() sends for one reading."""
+    if status is None:
+        status = FRAME_STATUS_ERROR if distance == DISTANCE_ERROR else 0
+    frame = FRAME.pack(FRAME_SYNC, seq & 0xFFFF, distance, status, 0)
+    return frame[:-1] + bytes((crc8(frame[1:-1]),))
+
+
+def frame_record(arrival, frame):
+    """DistanceRecord for a decoded frame."""
+    if frame.status & FRAME_STATUS_ERROR or frame.distance_mm == DISTANCE_ERROR:
+        return DistanceRecord(arrival, None, True)
+    return DistanceRecord(arrival, frame.distance_mm, False)
+
+
+class FrameDecoder(LineFramer):
+    """LineFramer that also recognises binary frames, returned as FirmwareFrame items.
+
+    ``mode`` is "text" or "binary" after the latest item, None before the first.
+    """
+
+    def __init__(self, max_line_length=MAX_LINE_LENGTH):
+        super().__init__(max_line_length)
+        self.mode = None
+
+    def feed(self, chunk, arrival):
+        """Append ``chunk`` and return ``(arrival, line or FirmwareFrame)`` for every completed item."""
+        buffer = self.buffer
+        buffer += chunk
+        items = []
+        start = scan = 0
+        size = len(buffer)
+        table = _CRC8_TABLE
+        while True:
+            # Fast path for back-to-back frames: CRC unrolled, no searching
+            if scan == start and size - scan >= FRAME_SIZE and buffer[scan] == FRAME_SYNC:
+                _, seq_low, seq_high, low, high, status, crc = _FRAME_BYTES.unpack_from(buffer, scan)
+                if table[table[table[table[table[seq_low] ^ seq_high] ^ low] ^ high] ^ status] == crc:
+                    items.append((arrival, FirmwareFrame(seq_low | seq_high << 8, low | high << 8, status)))
+                    self.mode = 'binary'
+                    start = scan = scan + FRAME_SIZE
+                    continue
+            sync = buffer.find(FRAME_SYNC, scan)
+            newline = buffer.find(LINE_TERMINATOR, scan, sync if sync >= 0 else size)
+            if newline >= 0:
+                line = bytes(buffer[start:newline]).rstrip(b"\r")
+                if line:
+                    items.append((arrival, line))
+                    self.mode = 'text'
+                start = scan = newline + 1
+                continue
+            if sync < 0 or size - sync < FRAME_SIZE:
+                break  # the rest of a line or frame is still to come
+            _, seq, distance, status, crc = FRAME.unpack_from(buffer, sync)
+            if crc8(buffer[sync + 1:sync + FRAME_SIZE - 1]) != crc:
+                scan = sync + 1  # not a frame: the byte belongs to the current line
+                continue
+            if sync > start:
+                # Leftovers of a damaged frame or line
+                items.append((arrival, bytes(buffer[start:sync])))
+            items.append((arrival, FirmwareFrame(seq, distance, status)))
+            self.mode = 'binary'
+            start = scan = sync + FRAME_SIZE
+        if start:
+            del buffer[:start]
+
+        # A run of garbage with no terminator must not grow the buffer forever
+        if len(buffer) > self.max_line_length:
+            items.append((arrival, bytes(buffer)))
+            buffer.clear()
+        return items
+
+
+def read_lines(ser, framer=None, idle=None):
+    """Yield ``(arrival, line)`` for each complete line received on ``ser``.
+
+    ``line`` is bytes for a text line or a FirmwareFrame for a binary frame.
+    ``framer`` defaults to a new FrameDecoder. ``idle(now)`` is called whenever
+    a read times out with no data.
+
+    ``ser.read()`` blocks until at least one byte arrives (or the port timeout
+    expires), then everything already buffered by the driver is drained in the
+    same call, so there is no polling sleep between a byte arriving and its line
+    being yielded.
+    """
+    framer = framer or FrameDecoder()
+    read_time = pipeline_metrics.stage('read')
+    while True:
+        waiting = ser.in_waiting
+        started = time.perf_counter()
+        chunk = ser.read(waiting or 1)
+        if not chunk:
+            if idle is not None:
+                idle(time.monotonic())
+            continue
+        # A read that had to wait for the first byte says nothing about read cost
+        if waiting:
+            read_time.time(started)
+        yield from framer.feed(chunk, time.monotonic())
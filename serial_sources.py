@@ -0,0 +1,270 @@
+import csv
+import math
+import os
+import random
+import select
+import socket
+import threading
+import time
+from datetime import datetime
+from urllib.parse import parse_qs, urlsplit
+
+from distance_recording import RECORDING_EXTENSION, Recording
+from distance_store import DISTANCE_ERROR, FLAG_ERROR
+from serial_ingest import pack_frame
+
+try:
+    import fcntl
+    import termios
+    import tty
+except ImportError:
+    # Windows: no pty support, in-process sources fall back to a socket pair
+    fcntl = termios = tty = None
+
+# --- Data Sources ---
+# Every source looks like a pyserial port to read_lines(): read(size),
+# in_waiting, fileno() and close(). The port spec selects the backend:
+#   COM7, /dev/ttyUSB0                  real serial port (pyserial)
+#   sim://?rate=200&error_rate=0.01     firmware simulator (&frames=1: binary frame protocol)
+#   replay://session.vlrec?speed=1      replay of a binary recording or CSV log
+SIMULATOR_BANNER = b"VL53L0X Distance Monitor Started\r\n"
+REPLAY_LOOP_GAP = 1.0  # seconds between passes of a looped session whose samples give no interval
+SOCKET_READ_SIZE = 4096  # the socket pair has no in_waiting, so read() takes whatever is there up to this
+
+
+def firmware_line(distance):
+    """The exact bytes uart_send_distance() in I2C_Vl52l0x_UART.c sends for ``distance``."""
+    if distance == DISTANCE_ERROR:
+        return b"distance: ERROR\r\n"
+    return b"distance: %d mm\r\n" % distance
+
+
+def open_source(spec, baudrate, timeout):
+    """Open the data source described by ``spec``."""
+    parts = urlsplit(spec)
+    if parts.scheme not in ('sim', 'replay'):
+        import serial
+
+        ser = serial.Serial(spec, baudrate, timeout=timeout)
+        try:
+            ser.dtr = False
+            ser.rts = False
+        except OSError:
+            pass  # no modem-control lines, e.g. the simulator's pty
+        return ser
+
+    options = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+    if parts.scheme == 'sim':
+        source = SimulatedSource(
+            rate=float(options.get('rate', 20)),
+            baudrate=int(options['baud']) if 'baud' in options else None,
+            error_rate=float(options.get('error_rate', 0.01)),
+            seed=int(options['seed']) if 'seed' in options else None,
+            frames=options.get('frames', '0') not in ('0', 'false', ''),
+            timeout=timeout)
+    else:
+        source = ReplaySource(
+            parts.netloc + parts.path,
+            speed=float(options.get('speed', 1)),
+            loop=options.get('loop', '0') not in ('0', 'false', ''),
+            timeout=timeout)
+    source.start()
+    return source
+
+
+class GeneratedSource:
+    """In-process source: a writer thread feeds firmware bytes through a loopback.
+
+    On POSIX the loopback is a raw pty, so ``device`` can also be opened by
+    another program (``test_serial.py``, a second server) exactly like a real
+    port. Elsewhere a socket pair is used. Subclasses implement ``generate()``,
+    yielding ``(due, chunk)`` with ``due`` in seconds from start; ``due=None``
+    means write immediately.
+    """
+
+    name = 'generated'
+
+    def __init__(self, timeout=1.0):
+        self.timeout = timeout
+        self.device = None
+        self.is_open = True
+        self.sent_lines = 0
+        if hasattr(os, 'openpty') and tty is not None:
+            self._write_fd, self._read_fd = os.openpty()
+            tty.setraw(self._read_fd)
+            self.device = os.ttyname(self._read_fd)
+            self._socket = None
+        else:
+            self._socket, writer = socket.socketpair()
+            self._socket.settimeout(timeout)
+            self._writer_socket = writer
+            self._read_fd = self._socket.fileno()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def generate(self):
+        raise NotImplementedError
+
+    def _run(self):
+        start = time.monotonic()
+        try:
+            for due, chunk in self.generate():
+                if not self.is_open:
+                    break
+                if due is not None:
+                    delay = start + due - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                self._write(chunk)
+                self.sent_lines += 1
+        except (OSError, ValueError) as e:
+            # Expected once closed underneath us; anything else would otherwise look like a silent port
+            if self.is_open:
+                print(f"[ERROR] {self.name} source stopped: {e}")
+                self.close()
+
+    def _write(self, chunk):
+        if self._socket is not None:
+            # Windows cannot os.write() to a socket handle
+            self._writer_socket.sendall(chunk)
+            return
+        view = memoryview(chunk)
+        while view:
+            view = view[os.write(self._write_fd, view):]
+
+    def fileno(self):
+        return self._read_fd
+
+    @property
+    def in_waiting(self):
+        if fcntl is None:
+            return 0
+        return int.from_bytes(fcntl.ioctl(self._read_fd, termios.FIONREAD, b'\0\0\0\0'), 'little')
+
+    def read(self, size=1):
+        if self._socket is not None:
+            try:
+                return self._socket.recv(max(size, SOCKET_READ_SIZE))
+            except socket.timeout:
+                return b''
+        ready, _, _ = select.select([self._read_fd], [], [], self.timeout)
+        if not ready:
+            return b''
+        return os.read(self._read_fd, max(size, 1))
+
+    def close(self):
+        if not self.is_open:
+            return
+        self.is_open = False
+        if self._socket is not None:
+            self._socket.close()
+            self._writer_socket.close()
+        else:
+            os.close(self._write_fd)
+            os.close(self._read_fd)
+
+
+class SimulatedSource(GeneratedSource):
+    """Emits the firmware line protocol for a target approaching and receding.
+
+    ``rate`` is readings per second (0 = as fast as the loopback accepts). With
+    ``baudrate`` set, output is additionally paced to what a real 8N1 UART link
+    of that speed could carry; without it rates far above 9600 baud are possible.
+    With ``frames`` set, readings are sent as binary frames (UART_BINARY_FRAMES);
+    the start-up banner is text either way.
+    """
+
+    name = 'simulator'
+
+    def __init__(self, rate=20.0, baudrate=None, error_rate=0.01, seed=None,
+                 near_mm=30, far_mm=800, period=10.0, noise_mm=4.0, frames=False, timeout=1.0):
+        super().__init__(timeout)
+        self.rate = rate
+        self.baudrate = baudrate
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.near_mm = near_mm
+        self.far_mm = far_mm
+        self.period = period
+        self.noise_mm = noise_mm
+        self.frames = frames
+
+    def distance_at(self, elapsed):
+        """Smooth sweep between near_mm and far_mm plus Gaussian sensor noise."""
+        phase = (1 - math.cos(2 * math.pi * elapsed / self.period)) / 2
+        distance = self.far_mm - (self.far_mm - self.near_mm) * phase
+        distance += self.random.gauss(0, self.noise_mm)
+        return max(0, min(int(distance), DISTANCE_ERROR - 1))
+
+    def generate(self):
+        yield None, SIMULATOR_BANNER
+        interval = 1.0 / self.rate if self.rate > 0 else 0.0
+        line_time = 0.0
+        index = 0
+        while True:
+            due = index * interval
+            if self.error_rate and self.random.random() < self.error_rate:
+                distance = DISTANCE_ERROR
+            else:
+                distance = self.distance_at(due)
+            line = pack_frame(index, distance) if self.frames else firmware_line(distance)
+            if self.baudrate:
+                # 10 bits per byte on an 8N1 link
+                due = max(due, line_time)
+                line_time = due + len(line) * 10 / self.baudrate
+            yield (due if interval or self.baudrate else None), line
+            index += 1
+
+
+class ReplaySource(GeneratedSource):
+    """Replays a binary recording (.vlrec) or a CSV log with its original timing.
+
+    ``speed`` scales time (2 = twice as fast, 0 = as fast as possible); with
+    ``loop`` the session restarts when it ends.
+    """
+
+    name = 'replay'
+
+    def __init__(self, path, speed=1.0, loop=False, timeout=1.0):
+        super().__init__(timeout)
+        self.path = path
+        self.speed = speed
+        self.loop = loop
+
+    def samples(self):
+        """Yield ``(timestamp, line)`` for every sample in the session file."""
+        if self.path.endswith(RECORDING_EXTENSION):
+            with Recording(self.path) as recording:
+                for timestamp, distance, flags in recording.records():
+                    if flags & FLAG_ERROR:
+                        distance = DISTANCE_ERROR
+                    yield timestamp, firmware_line(distance)
+        else:
+            with open(self.path, newline='') as f:
+                reader = csv.reader(f)
+                next(reader, None)  # Timestamp,[Sensor,]Data header
+                for row in reader:
+                    if len(row) >= 2:
+                        yield datetime.fromisoformat(row[0]).timestamp(), row[-1].encode('utf-8') + b"\r\n"
+
+    def generate(self):
+        offset = 0.0
+        while True:
+            first = last = gap = None
+            for timestamp, line in self.samples():
+                if first is None:
+                    first = timestamp
+                elif gap is None and timestamp > last:
+                    gap = timestamp - last
+                last = timestamp
+                if self.speed > 0:
+                    yield offset + (timestamp - first) / self.speed, line
+                else:
+                    yield None, line
+            if not self.loop or first is None:
+                return
+            if self.speed > 0:
+                # The next pass starts one sample interval after this one ended, not on top of it
+                offset += (last - first + (gap or REPLAY_LOOP_GAP)) / self.speed
@@ -0,0 +1,104 @@
+import gzip
+import hashlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# --- Static Assets ---
+# The dashboard pages, stylesheet and script do not change while the server
+# runs, so each one is encoded, hashed and compressed once at startup and a
+# request only picks a prepared body. Responses carry a strong ETag per
+# encoding: a browser revalidating an unchanged page gets an empty 304. The
+# pages link the stylesheet and script as "<path>?v=<version>"; requested with
+# the current version they may be cached for a year, otherwise they are
+# revalidated like the pages. Brotli is offered when the brotli package is
+# installed, gzip always.
+REVALIDATE = "no-cache"
+IMMUTABLE = "public, max-age=31536000, immutable"
+MIN_COMPRESS_BYTES = 256  # smaller bodies are sent as they are
+
+
+def gzip_compress(body):
+    # mtime=0 keeps the output, and so the ETag, identical across restarts
+    return gzip.compress(body, compresslevel=9, mtime=0)
+
+
+COMPRESSORS = [("gzip", gzip_compress)]
+if brotli is not None:
+    COMPRESSORS.insert(0, ("br", lambda body: brotli.compress(body, quality=11)))
+
+
+def accepted_encodings(header):
+    """Content codings an Accept-Encoding header allows (ignoring preference order)."""
+    accepted = set()
+    for item in (header or "").split(","):
+        name, _, params = item.partition(";")
+        name = name.strip().lower()
+        params = params.strip().lower()
+        if params.startswith("q="):
+            try:
+                if float(params[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        if name:
+            accepted.add(name)
+    return accepted
+
+
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        # If-None-Match compares weakly, so W/"x" matches "x"
+        if tag == "*" or (tag[2:] if tag.startswith("W/") else tag) == etag:
+            return True
+    return False
+
+
+class StaticAsset:
+    """One response body prepared once: identity, gzip and (optionally) brotli variants."""
+
+    def __init__(self, body, content_type):
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        self.content_type = content_type
+        self.version = hashlib.sha256(body).hexdigest()[:16]
+        self.variants = {None: body}
+        if len(body) >= MIN_COMPRESS_BYTES:
+            for encoding, compress in COMPRESSORS:
+                compressed = compress(body)
+                if len(compressed) < len(body):
+                    self.variants[encoding] = compressed
+
+    def url(self, path):
+        return f"{path}?v={self.version}"
+
+    def etag(self, encoding):
+        return f'"{self.version}-{encoding}"' if encoding else f'"{self.version}"'
+
+    def choose(self, accept_encoding):
+        accepted = accepted_encodings(accept_encoding)
+        for encoding, _ in COMPRESSORS:
+            if encoding in self.variants and (encoding in accepted or "*" in accepted):
+                return encoding
+        return None
+
+    def response(self, accept_encoding=None, if_none_match=None, version=None):
+        """``(status, headers, body)`` for a GET with these request headers and ``?v=``."""
+        encoding = self.choose(accept_encoding)
+        etag = self.etag(encoding)
+        headers = {
+            "Content-Type": self.content_type,
+            "Cache-Control": IMMUTABLE if version == self.version else REVALIDATE,
+            "ETag": etag,
+            "Vary": "Accept-Encoding"
+        }
+        if etag_matches(if_none_match, etag):
+            return 304, headers, b""
+        if encoding is not None:
+            headers["Content-Encoding"] = encoding
+        return 200, headers, self.variants[encoding]
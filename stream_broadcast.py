@@ -0,0 +1,165 @@
+import queue
+import threading
+import time
+
+import pipeline_metrics
+
+# --- Fan-out Configuration ---
+SUBSCRIBER_QUEUE_SIZE = 256  # frames buffered per client before some are dropped (see drop_frame())
+KEEPALIVE_INTERVAL = 15.0    # seconds of silence before a comment line is sent
+RECONNECT_DELAY_MS = 1000    # EventSource retry delay announced to clients
+REPLAY_LIMIT = 10000         # most readings replayed to a resuming client
+
+
+def format_sse(data, event=None, event_id=None):
+    """Encode one Server-Sent Events frame."""
+    frame = f"event: {event}\n" if event else ""
+    if event_id is not None:
+        frame += f"id: {event_id}\n"
+    for line in data.split("\n"):
+        frame += f"data: {line}\n"
+    return frame + "\n"
+
+
+def drop_frame(frames):
+    """Make room in a full deque of ``(seq, frame, retain)``: drop the oldest unretained frame, else the oldest.
+
+    Unretained frames (compact deltas and stats, WebSocket readings) only add
+    to the retained frame before them; dropping that key frame instead would
+    leave the deltas after it decoding against the wrong key.
+    """
+    for index, (seq, frame, retain) in enumerate(frames):
+        if not retain:
+            del frames[index]
+            return
+    frames.popleft()
+
+
+class SubscriberQueue(queue.Queue):
+    """A thread subscriber's frame queue."""
+
+    def make_room(self):
+        with self.mutex:
+            drop_frame(self.queue)
+
+
+class Broadcaster:
+    """Push pre-encoded frames to every subscriber through bounded queues.
+
+    Each frame is encoded once by the publisher and the same string object is
+    handed to all clients. A client that stops draining its queue loses
+    frames, unretained ones first (see drop_frame()), instead of holding back
+    the publisher or the other clients.
+
+    Frames published with a sequence number carry an SSE ``id:`` of the form
+    ``<epoch>-<seq>``. The epoch changes on every server start, so a browser's
+    ``Last-Event-ID`` from a previous run is never mistaken for a current one.
+
+    Listeners are called with ``(seq, frame, retain, meta)`` on every publish; the
+    asyncio server uses one to hand frames to its event loop (see
+    async_server.py). ``meta`` is whatever the publisher attached for filtering.
+    """
+
+    def __init__(self, queue_size=SUBSCRIBER_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self.epoch = f"{int(time.time()):x}"
+        self.subscribers = ()
+        self.listeners = ()
+        self.latest = None
+        self.dropped = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.subscribers)
+
+    def event_id(self, seq):
+        return f"{self.epoch}-{seq}"
+
+    def parse_event_id(self, event_id):
+        """Return the sequence number in ``event_id``, or None if it is malformed or stale."""
+        epoch, _, seq = (event_id or "").strip().partition("-")
+        if epoch != self.epoch or not seq.isdigit():
+            return None
+        return int(seq)
+
+    def subscribe(self):
+        subscriber = SubscriberQueue(maxsize=self.queue_size)
+        with self.lock:
+            self.subscribers = self.subscribers + (subscriber,)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            self.subscribers = tuple(s for s in self.subscribers if s is not subscriber)
+
+    def add_listener(self, listener):
+        with self.lock:
+            self.listeners = self.listeners + (listener,)
+
+    def remove_listener(self, listener):
+        with self.lock:
+            self.listeners = tuple(l for l in self.listeners if l is not listener)
+
+    def publish(self, frame, seq=None, retain=True, meta=None):
+        """Queue ``frame`` for every subscriber; never blocks.
+
+        A retained frame becomes ``latest``, the first frame a new client gets;
+        encodings whose frames only make sense after a key frame retain just
+        the key frames.
+        """
+        if retain:
+            self.latest = (seq, frame)
+        item = (seq, frame, retain)
+        # The subscriber tuple is replaced, never mutated, so no lock is needed here
+        for subscriber in self.subscribers:
+            try:
+                subscriber.put_nowait(item)
+            except queue.Full:
+                subscriber.make_room()
+                self.dropped += 1
+                try:
+                    subscriber.put_nowait(item)
+                except queue.Full:
+                    pass
+        for listener in self.listeners:
+            listener(seq, frame, retain, meta)
+
+    def stream(self, last_event_id=None, replay=None, keepalive=KEEPALIVE_INTERVAL):
+        """Generator for a streaming response.
+
+        A fresh client gets the latest frame and then every new one. A client
+        resuming with ``last_event_id`` instead gets ``replay(start_seq)`` (an
+        iterable of ``(seq, frame)`` pairs) for everything it missed, followed by
+        live frames with no gap and no duplicates.
+        """
+        # Subscribe before replaying so nothing published meanwhile is lost
+        subscriber = self.subscribe()
+        send_time = pipeline_metrics.stage('client_send')
+        try:
+            yield f"retry: {RECONNECT_DELAY_MS}\n\n"
+            resume_seq = self.parse_event_id(last_event_id)
+            if resume_seq is not None and replay is not None:
+                for seq, frame in replay(resume_seq + 1):
+                    resume_seq = seq
+                    yield frame
+            else:
+                # Frames queued meanwhile that the latest frame already covers are skipped
+                resume_seq = None
+                if self.latest is not None:
+                    resume_seq, frame = self.latest
+                    yield frame
+            while True:
+                try:
+                    seq, frame, _ = subscriber.get(timeout=keepalive)
+                except queue.Empty:
+                    # Comment line keeps proxies open and lets the server notice a gone client
+                    yield ": keepalive\n\n"
+                    continue
+                if seq is not None and resume_seq is not None and seq <= resume_seq:
+                    continue
+                # The server writes the frame to the socket before asking for the next one
+                started = time.perf_counter()
+                yield frame
+                send_time.time(started)
+        finally:
+            self.unsubscribe(subscriber)
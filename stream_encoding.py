@@ -0,0 +1,259 @@
+import json
+import struct
+
+from distance_store import DISTANCE_ERROR, format_distance, record_flags
+from stream_broadcast import Broadcaster, format_sse
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# --- Compact Stream Encodings ---
+# The default /stream frame is a self-contained JSON document of ~350 bytes.
+# The encodings here are for constrained links. Each is produced once per
+# reading and shared by every client that asked for it.
+#
+# Compact SSE (/stream?format=compact):
+#   event: key     JSON with the full state: seq, t (Unix ms), message,
+#                  distance_mm, error, smoothed_mm, zone, status, stats.
+#                  Sent every KEY_FRAME_INTERVAL, on status changes and for
+#                  lines that are not readings.
+#   event: stats   JSON stats, at most every STATS_INTERVAL and only if changed.
+#   (default)      "<seq>,<ms>,<distance>,<smoothed>,<zone>" for a reading:
+#                  seq and time as offsets from the last key frame, distance
+#                  "E" for ERROR, smoothed empty if unknown, zone s/w/d/-.
+#                  About 20 bytes instead of ~350 (plus its id: line).
+#   event: base    {"seq", "t", "status"}: the key frame later deltas refer to,
+#                  sent only at the end of a replay.
+# Reading frames carry SSE ids like the JSON stream, so a client reconnecting
+# with Last-Event-ID gets the readings it missed from history (see replay()):
+# a key frame and deltas to it, then a base frame pointing at the live key.
+#
+# WebSocket (/ws, asyncio server only), one message per reading:
+#   format=json     text {"sensor", "seq", "t", "d", "s", "z"}
+#   format=binary   WS_READING (17 bytes, no sensor ID)
+#   format=msgpack  [sensor, seq, ms, distance, smoothed, zone]
+# plus JSON text messages with the sensor's status and stats, on change as above.
+# Reading frames carry ``(sensor_id, record)`` as Broadcaster meta, which the
+# server uses to apply each client's subscription filters.
+KEY_FRAME_INTERVAL = 10.0  # seconds
+STATS_INTERVAL = 2.0  # seconds
+ZONE_LETTERS = {None: '-', 'safe': 's', 'warning': 'w', 'danger': 'd'}
+
+# seq, Unix time, distance (0xFFFF = ERROR), smoothed (0xFFFF = none), flags as in distance_store
+WS_READING = struct.Struct('<IdHHB')
+
+WS_TEXT = 0x1
+WS_BINARY = 0x2
+WS_CLOSE = 0x8
+WS_PING = 0x9
+WS_PONG = 0xA
+
+
+def websocket_frame(payload, opcode):
+    """One unmasked, unfragmented server-to-client WebSocket frame."""
+    length = len(payload)
+    if length < 126:
+        header = bytes((0x80 | opcode, length))
+    elif length < 65536:
+        header = bytes((0x80 | opcode, 126)) + length.to_bytes(2, 'big')
+    else:
+        header = bytes((0x80 | opcode, 127)) + length.to_bytes(8, 'big')
+    return header + payload
+
+
+def compact_stats(stats):
+    """Stats rounded to what the dashboard shows, so that noise does not count as a change."""
+    return {name: round(value, 1) if isinstance(value, float) else value for name, value in stats.items()}
+
+
+def pack_json(sensor_id, seq, timestamp, record):
+    data = {"sensor": sensor_id, "seq": seq, "t": round(timestamp * 1000),
+            "d": record.distance_mm, "s": record.smoothed_mm, "z": record.zone}
+    return json.dumps(data, separators=(',', ':')).encode('utf-8')
+
+
+def pack_binary(sensor_id, seq, timestamp, record):
+    distance = DISTANCE_ERROR if record.error else record.distance_mm
+    smoothed = DISTANCE_ERROR if record.smoothed_mm is None else record.smoothed_mm
+    return WS_READING.pack(seq & 0xFFFFFFFF, timestamp, distance, smoothed, record_flags(record))
+
+
+def pack_msgpack(sensor_id, seq, timestamp, record):
+    return msgpack.packb([sensor_id, seq, round(timestamp * 1000), record.distance_mm, record.smoothed_mm,
+                          record.zone])
+
+
+class EncodedStream:
+    """A Broadcaster for one alternative encoding, only fed while someone listens."""
+
+    def __init__(self, sensor_id):
+        self.sensor_id = sensor_id
+        self.broadcaster = Broadcaster()
+        self.reset()
+
+    @property
+    def active(self):
+        return bool(self.broadcaster.subscribers or self.broadcaster.listeners)
+
+    def reset(self):
+        """Forget the encoding state; the next publish starts afresh."""
+        self.broadcaster.latest = None
+        self.status = None
+        self.stats = None
+        self.stats_time = None
+
+    def stats_changed(self, timestamp, stats):
+        """Rounded stats if they are due and differ from the ones last sent, else None."""
+        if self.stats_time is not None and timestamp - self.stats_time < STATS_INTERVAL:
+            return None
+        stats = compact_stats(stats)
+        self.stats_time = timestamp
+        if stats == self.stats:
+            return None
+        self.stats = stats
+        return stats
+
+    def skip(self, seq):
+        """Called instead of publish() while nobody listens; the next publish starts afresh."""
+        if self.status is not None:
+            self.reset()
+
+    def publish_stats(self, timestamp, state, stats):
+        """Send the stats between readings if they changed, e.g. rates decaying while the sensor is quiet."""
+        if self.status is None:
+            return  # nothing sent yet; the first frame carries the stats
+        changed = self.stats_changed(timestamp, stats)
+        if changed is not None:
+            self.broadcaster.publish(self.stats_frame(changed, state), retain=False)
+
+    def state_data(self, seq, timestamp, state, stats):
+        self.status = state.connection_status
+        self.stats = compact_stats(stats)
+        self.stats_time = timestamp
+        return {"sensor": self.sensor_id, "seq": seq, "t": round(timestamp * 1000), "message": state.latest_data,
+                "status": state.connection_status, "stats": self.stats}
+
+
+class CompactSseStream(EncodedStream):
+    """Key frames plus small delta-encoded reading frames for /stream?format=compact."""
+
+    def __init__(self, sensor_id):
+        # (seq of the last reading handled, key its successors are encoded against), rebound as a whole
+        # after each reading so replay() sees a consistent pair
+        self.position = (None, None)
+        super().__init__(sensor_id)
+
+    def reset(self):
+        super().reset()
+        self.key = None
+        self.key_time = None
+        self.position = (self.position[0], None)
+
+    def skip(self, seq):
+        super().skip(seq)
+        if seq is not None:
+            self.position = (seq, None)
+
+    def publish(self, seq, record, state, timestamp, stats):
+        milliseconds = round(timestamp * 1000)
+        if (record is None or self.key is None or state.connection_status != self.status
+                or timestamp - self.key_time >= KEY_FRAME_INTERVAL):
+            data = self.state_data(seq, timestamp, state, stats)
+            if record is not None:
+                data.update(distance_mm=record.distance_mm, error=record.error,
+                            smoothed_mm=record.smoothed_mm, zone=record.zone)
+            # Without a reading there is nothing for deltas to refer to, so the next reading is a key frame
+            self.key = None if record is None else (seq, milliseconds)
+            self.key_time = timestamp
+            event_id = None if seq is None else self.broadcaster.event_id(seq)
+            self.broadcaster.publish(format_sse(json.dumps(data, separators=(',', ':')), event="key",
+                                                event_id=event_id), seq)
+            self.position = (self.position[0] if seq is None else seq, self.key)
+            return
+
+        changed = self.stats_changed(timestamp, stats)
+        if changed is not None:
+            self.broadcaster.publish(self.stats_frame(changed, state), retain=False)
+        self.broadcaster.publish(self.delta_frame(self.key, seq, milliseconds, record), seq, retain=False)
+        self.position = (seq, self.key)
+
+    def delta_frame(self, key, seq, milliseconds, record):
+        key_seq, key_milliseconds = key
+        distance = 'E' if record.error else record.distance_mm
+        smoothed = '' if record.smoothed_mm is None else record.smoothed_mm
+        return (f"id: {self.broadcaster.event_id(seq)}\ndata: {seq - key_seq},{milliseconds - key_milliseconds},"
+                f"{distance},{smoothed},{ZONE_LETTERS[record.zone]}\n\n")
+
+    def replay(self, start_seq, readings, position, state, stats):
+        """``(seq, frame)`` pairs for a client resuming at ``start_seq``.
+
+        ``readings`` are the ``(seq, timestamp, record)`` it missed, up to and
+        including ``position``'s seq (taken before reading history, so every
+        later reading is still to be published). The first is sent as a key
+        frame and the rest as deltas to it; a base frame then points the client
+        at the live key. Without a live key the next live reading is a key frame.
+        """
+        last_seq, live_key = position
+        key = None
+        for seq, timestamp, record in readings:
+            milliseconds = round(timestamp * 1000)
+            if key is None:
+                data = {"sensor": self.sensor_id, "seq": seq, "t": milliseconds, "message": format_distance(record),
+                        "status": state.connection_status, "stats": compact_stats(stats),
+                        "distance_mm": record.distance_mm, "error": record.error,
+                        "smoothed_mm": record.smoothed_mm, "zone": record.zone}
+                key = (seq, milliseconds)
+                yield seq, format_sse(json.dumps(data, separators=(',', ':')), event="key",
+                                      event_id=self.broadcaster.event_id(seq))
+            else:
+                yield seq, self.delta_frame(key, seq, milliseconds, record)
+        if live_key is not None and last_seq is not None:
+            data = {"seq": live_key[0], "t": live_key[1], "status": state.connection_status}
+            yield max(last_seq, start_seq - 1), format_sse(json.dumps(data, separators=(',', ':')), event="base")
+
+    def stats_frame(self, stats, state):
+        return format_sse(json.dumps(stats, separators=(',', ':')), event="stats")
+
+
+class WebSocketStream(EncodedStream):
+    """Pre-framed WebSocket messages: ``pack(sensor_id, seq, timestamp, record)`` readings plus JSON status text."""
+
+    def __init__(self, sensor_id, pack, opcode=WS_BINARY):
+        super().__init__(sensor_id)
+        self.pack = pack
+        self.opcode = opcode
+
+    def publish(self, seq, record, state, timestamp, stats):
+        if record is None or state.connection_status != self.status:
+            data = self.state_data(seq, timestamp, state, stats)
+            # Retained, so a new client starts with the current status and stats
+            self.broadcaster.publish(websocket_frame(json.dumps(data).encode('utf-8'), WS_TEXT))
+        else:
+            changed = self.stats_changed(timestamp, stats)
+            if changed is not None:
+                self.broadcaster.publish(self.stats_frame(changed, state))
+        if record is not None:
+            payload = self.pack(self.sensor_id, seq, timestamp, record)
+            self.broadcaster.publish(websocket_frame(payload, self.opcode), seq, retain=False,
+                                     meta=(self.sensor_id, record))
+
+    def stats_frame(self, stats, state):
+        data = {"sensor": self.sensor_id, "stats": stats, "status": state.connection_status}
+        return websocket_frame(json.dumps(data).encode('utf-8'), WS_TEXT)
+
+
+WEBSOCKET_FORMATS = ('json', 'binary', 'msgpack')
+
+
+def encoded_streams(sensor_id):
+    """The alternative encodings a channel offers, by format name."""
+    streams = {
+        "compact": CompactSseStream(sensor_id),
+        "json": WebSocketStream(sensor_id, pack_json, WS_TEXT),
+        "binary": WebSocketStream(sensor_id, pack_binary),
+    }
+    if msgpack is not None:
+        streams["msgpack"] = WebSocketStream(sensor_id, pack_msgpack)
+    return streams
@@ -0,0 +1,103 @@
+import math
+
+# --- Stream Statistics ---
+# Sliding-window rates over fixed time buckets. A sample is added to the
+# current bucket and to the running totals of every window; a bucket leaving a
+# window is subtracted from that window's totals once. The cost per sample is
+# therefore the same for a 1 s and a 60 s window, and a quiet spell only costs
+# one step per elapsed bucket (capped at the ring size).
+BUCKET_WIDTH = 0.1  # seconds
+STATS_WINDOWS = (1.0, 10.0, 60.0)  # seconds, shortest first
+
+# Per-bucket and per-window totals: messages, bytes, errors, intervals,
+# sum of intervals, sum of squared intervals
+COUNT, BYTES, ERRORS, INTERVALS, INTERVAL_SUM, INTERVAL_SQUARES = range(6)
+
+EMPTY_RATES = {"message_rate": 0.0, "data_rate": 0.0, "error_rate": 0.0, "interval_ms": 0.0, "jitter_ms": 0.0}
+
+
+def window_label(window):
+    return f"{window:g}s"
+
+
+class StreamStats:
+    """Message, byte and error rates plus inter-arrival jitter over several sliding windows.
+
+    Fed by one reader; ``add()`` takes the sample's monotonic arrival time.
+    ``snapshot()`` returns a new dict each time, so it can be shared with
+    other threads as it is.
+    """
+
+    def __init__(self, windows=STATS_WINDOWS, bucket_width=BUCKET_WIDTH):
+        self.windows = tuple(windows)
+        self.bucket_width = bucket_width
+        self.window_buckets = tuple(max(1, round(window / bucket_width)) for window in self.windows)
+        self.size = max(self.window_buckets)
+        self.ring = [[0, 0, 0, 0, 0.0, 0.0] for _ in range(self.size)]
+        self.totals = [[0, 0, 0, 0, 0.0, 0.0] for _ in self.windows]
+        self.bucket = None
+        self.start = None
+        self.last_arrival = None
+
+    def advance(self, now):
+        """Make the bucket containing ``now`` current; returns True if it changed."""
+        bucket = int(now / self.bucket_width)
+        if self.bucket is None:
+            self.bucket, self.start = bucket, now
+            return True
+        if bucket <= self.bucket:
+            return False
+        if bucket - self.bucket >= self.size:
+            # Quiet for longer than the longest window: everything has expired
+            for values in self.ring + self.totals:
+                values[:] = [0, 0, 0, 0, 0.0, 0.0]
+        else:
+            for entering in range(self.bucket + 1, bucket + 1):
+                for totals, length in zip(self.totals, self.window_buckets):
+                    leaving = self.ring[(entering - length) % self.size]
+                    for index in range(6):
+                        totals[index] -= leaving[index]
+                    if not totals[INTERVALS]:
+                        # Drop float residue once the window holds no intervals
+                        totals[INTERVAL_SUM] = totals[INTERVAL_SQUARES] = 0.0
+                self.ring[entering % self.size][:] = [0, 0, 0, 0, 0.0, 0.0]
+        self.bucket = bucket
+        return True
+
+    def add(self, now, size, error=False):
+        """Count one message of ``size`` bytes; returns True if a new bucket was started."""
+        advanced = self.advance(now)
+        if self.last_arrival is None:
+            sample = (1, size, int(error), 0, 0.0, 0.0)
+        else:
+            interval = now - self.last_arrival
+            sample = (1, size, int(error), 1, interval, interval * interval)
+        self.last_arrival = now
+        for values in [self.ring[self.bucket % self.size]] + self.totals:
+            for index in range(6):
+                values[index] += sample[index]
+        return advanced
+
+    def snapshot(self, now):
+        """Rates per second, mean interval and jitter (interval std dev) for every window.
+
+        ``now`` should be the time of the latest ``add()`` or ``advance()``.
+        """
+        if self.start is None:
+            return {window_label(window): dict(EMPTY_RATES) for window in self.windows}
+        rates = {}
+        # The current bucket is only partly elapsed
+        current = now - self.bucket * self.bucket_width
+        for window, length, totals in zip(self.windows, self.window_buckets, self.totals):
+            span = max(min((length - 1) * self.bucket_width + current, now - self.start), self.bucket_width)
+            intervals = totals[INTERVALS]
+            mean = totals[INTERVAL_SUM] / intervals if intervals else 0.0
+            variance = totals[INTERVAL_SQUARES] / intervals - mean * mean if intervals else 0.0
+            rates[window_label(window)] = {
+                "message_rate": totals[COUNT] / span,
+                "data_rate": totals[BYTES] / span,
+                "error_rate": totals[ERRORS] / span,
+                "interval_ms": mean * 1000,
+                "jitter_ms": math.sqrt(max(variance, 0.0)) * 1000
+            }
+        return rates
@@ -1,8 +1,13 @@
+import os
+import sys
 import serial
 import time
+from serial_ingest import FirmwareFrame, read_lines
+from serial_sources import open_source
 
 # --- Configuration ---
-SERIAL_PORT = 'COM7'
+# A real port name, or sim://... / replay://... (see serial_sources.py)
+SERIAL_PORT = sys.argv[1] if len(sys.argv) > 1 else os.environ.get('SERIAL_PORT', 'COM7')
 SERIAL_BAUDRATE = 9600
 
 print(f"Attempting to open {SERIAL_PORT}...")
@@ -10,29 +15,24 @@ ser = None # Initialize variable
 
 try:
     # Open the serial port with DTR and RTS explicitly disabled
-    ser = serial.Serial(SERIAL_PORT, SERIAL_BAUDRATE, timeout=0.1)
-    ser.dtr = False
-    ser.rts = False
+    ser = open_source(SERIAL_PORT, SERIAL_BAUDRATE, timeout=1.0)
     print(f"Successfully opened {SERIAL_PORT}. Waiting for data...")
     print("(Press Ctrl+C to stop)")
     time.sleep(1) # Give the port a moment to settle
 
-    # This loop will now run correctly
-    while True:
-        # Check if there are any bytes waiting in the input buffer
-        if ser.in_waiting > 0:
-            # Read all the bytes that are waiting
-            data_bytes = ser.read(ser.in_waiting)
-            try:
-                # Try to decode the bytes as text and print them
-                data_str = data_bytes.decode('utf-8')
-                print(data_str, end='', flush=True)
-            except UnicodeDecodeError:
-                # This handles cases where data might be corrupted
-                print(f"\nReceived {len(data_bytes)} undecodable bytes.\n")
-        
-        # A small delay to prevent the loop from using 100% CPU
-        time.sleep(0.05)
+    # Blocking, line-framed reads: one complete firmware line at a time
+    for arrival, data_bytes in read_lines(ser):
+        if isinstance(data_bytes, FirmwareFrame):
+            # Binary frame protocol (UART_BINARY_FRAMES in the firmware)
+            print(f"frame {data_bytes.seq}: {data_bytes.distance_mm} mm, status {data_bytes.status:#04x}", flush=True)
+            continue
+        try:
+            # Try to decode the bytes as text and print them
+            data_str = data_bytes.decode('utf-8')
+            print(data_str, flush=True)
+        except UnicodeDecodeError:
+            # This handles cases where data might be corrupted
+            print(f"\nReceived {len(data_bytes)} undecodable bytes.\n")
 
 except serial.SerialException as e:
     print(f"ERROR: Could not open or read from serial port. {e}")
@@ -1,53 +1,8 @@
-import serial
-import time
-import threading
-import json
-import csv
-import os
-from datetime import datetime
-from collections import deque
-from flask import Flask, Response, render_template_string, request, jsonify
-
-# Check for required libraries
-try:
-    import serial
-    print(f"[INFO] Required libraries found - pyserial: {serial.__version__}")
-except ImportError as e:
-    print(f"[ERROR] Missing required library: {e}")
-    print("[INFO] Please install: pip install pyserial flask")
-    exit(1)
-
-# --- Serial Configuration ---
-SERIAL_PORT = 'COM7'
-SERIAL_BAUDRATE = 9600
-
-# --- Global Variables ---
-latest_data = "No data yet"
-data_history = deque(maxlen=1000)
-connection_status = "Disconnected"
-total_bytes = 0
-message_count = 0
-start_time = datetime.now()
-data_logging = False
-log_filename = ""
-
-# --- Flask Setup ---
-app = Flask(__name__)
-
-# Disable Flask logging for cleaner output
-import logging
-log = logging.getLogger('werkzeug')
-log.setLevel(logging.WARNING)
+from dashboard_server import run_dashboard
 
 # Enhanced HTML Template with Modern UI
-HTML_PAGE = """
-<!DOCTYPE html>
-<html>
-<head>
-    <title>Dynamic Serial Monitor Pro</title>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <style>
+# Served as /static/dashboard.css and /static/dashboard.js (see static_assets.py)
+DASHBOARD_CSS = """
         @import url('https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0/css/all.min.css');
         
         * {
@@ -78,7 +33,7 @@ HTML_PAGE = """
         
         .status-grid {
             display: grid;
-            grid-template-columns: repeat(6, 1fr);
+            grid-template-columns: repeat(7, 1fr);
             gap: 20px;
             padding: 25px 30px;
             background: rgba(0, 0, 0, 0.2);
@@ -144,6 +99,10 @@ HTML_PAGE = """
             box-shadow: 0 0 15px #ff4757;
         }
         
+        .zone-safe { color: #00ff88; }
+        .zone-warning { color: #ffd32a; }
+        .zone-danger { color: #ff4757; }
+        
         @keyframes pulse {
             0%, 100% { opacity: 1; }
             50% { opacity: 0.6; }
@@ -260,6 +219,16 @@ HTML_PAGE = """
             color: rgba(255, 255, 255, 0.7);
         }
         
+        .distance-chart {
+            display: block;
+            flex: none;
+            width: 100%;
+            height: 180px;
+            background: rgba(0, 0, 0, 0.6);
+            border-bottom: 1px solid rgba(255, 255, 255, 0.1);
+            color: #00ff88;
+        }
+        
         .data-display {
             flex: 1;
             overflow-y: auto;
@@ -284,19 +253,28 @@ HTML_PAGE = """
             border-radius: 4px;
         }
         
+        .data-spacer {
+            position: relative;
+        }
+        
+        .data-rows {
+            position: absolute;
+            top: 0;
+            left: 0;
+            right: 0;
+            will-change: transform;
+        }
+        
         .data-line {
             margin-bottom: 8px;
             padding: 8px 12px;
             background: rgba(0, 0, 0, 0.2);
             border-left: 3px solid #3b82f6;
             border-radius: 0 6px 6px 0;
-            animation: slideIn 0.3s ease-out;
-            word-break: break-all;
-        }
-        
-        @keyframes slideIn {
-            from { opacity: 0; transform: translateX(-20px); }
-            to { opacity: 1; transform: translateX(0); }
+            /* One fixed-height line per reading: the list is virtualized */
+            white-space: nowrap;
+            overflow: hidden;
+            text-overflow: ellipsis;
         }
         
         .timestamp {
@@ -425,217 +403,381 @@ HTML_PAGE = """
             margin-top: 10px;
             font-size: 0.9rem;
         }
-    </style>
-</head>
-<body>
-    <div class="header">
-        <h1><i class="fas fa-satellite-dish"></i> Dynamic Serial Monitor Pro</h1>
-    </div>
-    
-    <div class="status-grid">
-        <div class="status-card">
-            <span class="status-value" id="connection-status">
-                <span class="connection-indicator disconnected"></span>Disconnected
-            </span>
-            <span class="status-label">Connection Status</span>
-        </div>
-        <div class="status-card">
-            <span class="status-value" id="port-info">{{port}}</span>
-            <span class="status-label">Port</span>
-        </div>
-        <div class="status-card">
-            <span class="status-value" id="baudrate-info">{{baudrate}}</span>
-            <span class="status-label">Baud Rate</span>
-        </div>
-        <div class="status-card">
-            <span class="status-value" id="message-count">0</span>
-            <span class="status-label">Messages</span>
-        </div>
-        <div class="status-card">
-            <span class="status-value" id="bytes-count">0 B</span>
-            <span class="status-label">Total Bytes</span>
-        </div>
-        <div class="status-card">
-            <span class="status-value" id="uptime">00:00:00</span>
-            <span class="status-label">Uptime</span>
-        </div>
-    </div>
-    
-    <div class="controls-section">
-        <div class="controls-grid">
-            <button class="btn btn-primary" onclick="clearDisplay()">
-                <i class="fas fa-trash"></i> Clear Display
-            </button>
-            <button class="btn btn-success" onclick="downloadData()">
-                <i class="fas fa-download"></i> Download Data
-            </button>
-            <button class="btn btn-warning" onclick="toggleLogging()" id="log-btn">
-                <i class="fas fa-file-alt"></i> Start Logging
-            </button>
-            <label class="checkbox-wrapper">
-                <input type="checkbox" id="auto-scroll" checked onchange="toggleAutoScroll()">
-                <i class="fas fa-arrows-alt-v"></i>
-                <span>Auto Scroll</span>
-            </label>
-            <label class="checkbox-wrapper">
-                <input type="checkbox" id="timestamps" checked onchange="toggleTimestamps()">
-                <i class="fas fa-clock"></i>
-                <span>Show Timestamps</span>
-            </label>
-            <label class="checkbox-wrapper">
-                <input type="checkbox" id="sound-alerts" onchange="toggleSoundAlerts()">
-                <i class="fas fa-volume-up"></i>
-                <span>Sound Alerts</span>
-            </label>
-        </div>
-    </div>
-    
-    <div class="main-layout">
-        <div class="data-panel">
-            <div class="panel-header">
-                <i class="fas fa-stream"></i>
-                <span class="panel-title">Live Serial Data Stream</span>
-                <span class="data-rate" id="data-rate-display">0 B/s</span>
-            </div>
-            <div class="data-display" id="data-display">
-                <div class="no-data-message">
-                    <i class="loading-spinner"></i> Waiting for data...
-                </div>
-            </div>
-        </div>
-        
-        <div class="sidebar">
-            <div class="stats-panel">
-                <div class="panel-header">
-                    <i class="fas fa-chart-bar"></i>
-                    <span class="panel-title">Live Statistics</span>
-                </div>
-                <div class="stats-grid">
-                    <div class="stat-item">
-                        <span class="stat-value" id="avg-msg-size">0 B</span>
-                        <span class="stat-label">Avg Message Size</span>
-                    </div>
-                    <div class="stat-item">
-                        <span class="stat-value" id="msg-rate">0.0/s</span>
-                        <span class="stat-label">Messages/sec</span>
-                    </div>
-                    <div class="stat-item">
-                        <span class="stat-value" id="data-rate">0 B/s</span>
-                        <span class="stat-label">Data Rate</span>
-                    </div>
-                    <div class="stat-item">
-                        <span class="stat-value" id="last-message">1:14:03 PM</span>
-                        <span class="stat-label">Last Message</span>
-                    </div>
-                </div>
-            </div>
-            
-            <div class="filter-panel">
-                <div class="panel-header">
-                    <i class="fas fa-filter"></i>
-                    <span class="panel-title">Data Filter</span>
-                </div>
-                <div class="filter-content">
-                    <div class="input-group">
-                        <label><i class="fas fa-search"></i> Filter Text</label>
-                        <input type="text" class="form-control" id="filter-text" 
-                               placeholder="Enter text to filter..." 
-                               onkeyup="applyFilter()">
-                    </div>
-                    <button class="btn btn-danger" onclick="clearFilter()" style="width: 100%;">
-                        <i class="fas fa-times"></i> Clear Filter
-                    </button>
-                </div>
-            </div>
-        </div>
-    </div>
+"""
 
-    <script>
+DASHBOARD_JS = """
         let showTimestamps = true;
         let autoScrollEnabled = true;
         let soundAlertsEnabled = false;
         let filterText = '';
-        let allData = [];
         let startTime = new Date();
         
-        // Server-Sent Events connection
+        // Server-Sent Events connection, compact encoding: "key" events carry the
+        // full state, plain frames are "<seq>,<ms>,<distance>,<smoothed>,<zone>"
+        // relative to the last key frame
         console.log("Starting EventSource connection...");
-        const evtSource = new EventSource("/stream");
+        const sensorId = document.body.dataset.sensor;
+        const evtSource = new EventSource("/stream?format=compact&sensor=" + encodeURIComponent(sensorId));
+        const zoneNames = {s: 'safe', w: 'warning', d: 'danger'};
+        let keyFrame = null;
         
         evtSource.onopen = function(event) {
             console.log("EventSource connection opened");
         };
         
+        evtSource.addEventListener('key', function(event) {
+            keyFrame = JSON.parse(event.data);
+            if ('distance_mm' in keyFrame) {
+                chartPush(keyFrame.t, keyFrame.error ? NaN : keyFrame.distance_mm);
+            }
+            handleData(Object.assign({}, keyFrame, {timestamp: new Date(keyFrame.t).toISOString()}));
+        });
+        
+        // After a reconnect the server replays what was missed (a key frame and
+        // deltas to it), then says which key the live deltas refer to
+        evtSource.addEventListener('base', function(event) {
+            keyFrame = Object.assign({}, keyFrame, JSON.parse(event.data));
+        });
+        
+        evtSource.addEventListener('stats', function(event) {
+            // Also sent while no readings arrive, so it says nothing about the last message
+            pendingUpdate.stats = JSON.parse(event.data);
+            requestFrame();
+        });
+        
         evtSource.onmessage = function(event) {
-            try {
-                const data = JSON.parse(event.data);
-                updateDisplay(data);
-                updateStatistics(data);
-                
-                // Play sound alert if enabled
-                if (soundAlertsEnabled && data.message && data.message !== "No data yet") {
-                    playNotificationSound();
-                }
-            } catch (e) {
-                console.log("Error parsing JSON, treating as plain text");
-                const data = {
-                    message: event.data,
-                    timestamp: new Date().toISOString(),
-                    status: 'Connected'
-                };
-                updateDisplay(data);
+            // Frames before the first key frame cannot be decoded
+            if (keyFrame === null) {
+                return;
             }
+            const [seq, ms, distance, smoothed, zone] = event.data.split(',');
+            const error = distance === 'E';
+            chartPush(keyFrame.t + Number(ms), error ? NaN : Number(distance));
+            handleData({
+                seq: keyFrame.seq + Number(seq),
+                timestamp: new Date(keyFrame.t + Number(ms)).toISOString(),
+                message: error ? 'distance: ERROR' : `distance: ${distance} mm`,
+                distance_mm: error ? null : Number(distance),
+                error: error,
+                smoothed_mm: smoothed === '' ? null : Number(smoothed),
+                zone: zoneNames[zone] || null,
+                status: keyFrame.status
+            });
         };
         
+        function handleData(data) {
+            allData.push(data);
+            if (shouldShowMessage(data.message)) {
+                shown.push(data);
+            }
+            // Only the newest zone, stats and status matter by the next frame
+            if (data.zone) {
+                pendingUpdate.zone = data.zone;
+            }
+            if (data.stats) {
+                pendingUpdate.stats = data.stats;
+            }
+            // Every decoded reading (deltas included) carries its own time
+            if (data.timestamp) {
+                pendingUpdate.timestamp = data.timestamp;
+            }
+            if (data.status) {
+                pendingUpdate.status = data.status;
+            }
+            // Sound alerts are also coalesced: at most one beep per frame
+            if (soundAlertsEnabled && data.message && data.message !== "No data yet") {
+                alertPending = true;
+            }
+            requestFrame();
+        }
+        
         evtSource.onerror = function(event) {
             console.error("EventSource error:", event);
             updateConnectionStatus("Connection Error");
         };
         
-        function updateDisplay(data) {
-            const display = document.getElementById('data-display');
-            const timestamp = new Date(data.timestamp).toLocaleTimeString();
+        // --- Live Data Pane ---
+        // Events only update the ring buffers below; the page is drawn at most
+        // once per animation frame however fast readings arrive. The pane is
+        // virtualized: a spacer gives the scrollbar its full height and only the
+        // rows in view exist, reused as the view moves, so layout cost depends on
+        // the height of the pane and not on the reading rate.
+        const HISTORY_LINES = 1000;  // readings kept for filtering and download
+        
+        class RingBuffer {
+            constructor(capacity) {
+                this.capacity = capacity;
+                this.items = new Array(capacity);
+                this.clear();
+            }
             
-            // Store all data
-            allData.push(data);
-            if (allData.length > 1000) {
-                allData.shift();
+            clear() {
+                this.start = 0;
+                this.length = 0;
             }
             
-            // Remove "waiting for data" message on first real data
-            if (data.message && data.message !== "No data yet" && display.querySelector('.no-data-message')) {
-                display.innerHTML = '';
+            push(item) {
+                if (this.length < this.capacity) {
+                    this.items[(this.start + this.length) % this.capacity] = item;
+                    this.length++;
+                } else {
+                    // Full: overwrite the oldest
+                    this.items[this.start] = item;
+                    this.start = (this.start + 1) % this.capacity;
+                }
             }
             
-            // Apply filter
-            if (shouldShowMessage(data.message)) {
-                const dataLine = document.createElement('div');
-                dataLine.className = 'data-line';
-                
-                let content = '';
-                if (showTimestamps) {
-                    content += `<span class="timestamp">[${timestamp}]</span>`;
+            get(index) {
+                return this.items[(this.start + index) % this.capacity];
+            }
+            
+            toArray() {
+                const items = [];
+                for (let i = 0; i < this.length; i++) {
+                    items.push(this.get(i));
                 }
-                content += data.message;
-                
-                dataLine.innerHTML = content;
-                display.appendChild(dataLine);
-                
-                // Keep only last 200 visible messages for performance
-                while (display.children.length > 200) {
-                    display.removeChild(display.firstChild);
+                return items;
+            }
+        }
+        
+        const allData = new RingBuffer(HISTORY_LINES);
+        const shown = new RingBuffer(HISTORY_LINES);  // the readings that pass the filter
+        let pendingUpdate = {};
+        let frameRequested = false;
+        let alertPending = false;
+        let spacer = null;
+        let rowBox = null;
+        let rows = [];
+        let rowHeight = 0;
+        
+        function requestFrame() {
+            if (!frameRequested) {
+                frameRequested = true;
+                requestAnimationFrame(drawFrame);
+            }
+        }
+        
+        function drawFrame() {
+            frameRequested = false;
+            const update = pendingUpdate;
+            pendingUpdate = {};
+            updateStatistics(update);
+            if (update.status) {
+                updateConnectionStatus(update.status);
+            }
+            if (alertPending) {
+                alertPending = false;
+                playNotificationSound();
+            }
+            drawChart();
+            updateDisplay();
+        }
+        
+        function updateDisplay() {
+            const display = document.getElementById('data-display');
+            if (spacer === null) {
+                if (shown.length === 0) {
+                    return;
                 }
-                
-                // Auto scroll
-                if (autoScrollEnabled) {
-                    display.scrollTop = display.scrollHeight;
+                // First rows: replace the placeholder message with the list
+                display.innerHTML = '';
+                spacer = document.createElement('div');
+                spacer.className = 'data-spacer';
+                rowBox = document.createElement('div');
+                rowBox.className = 'data-rows';
+                spacer.appendChild(rowBox);
+                display.appendChild(spacer);
+                rowHeight = measureRow();
+                display.onscroll = requestFrame;
+            }
+            
+            spacer.style.height = (shown.length * rowHeight) + 'px';
+            if (autoScrollEnabled) {
+                display.scrollTop = display.scrollHeight;
+            }
+            
+            // Rows in view plus one either side
+            const first = Math.max(0, Math.floor(display.scrollTop / rowHeight) - 1);
+            const count = Math.max(0, Math.min(shown.length - first, Math.ceil(display.clientHeight / rowHeight) + 2));
+            while (rows.length < count) {
+                rows.push(rowBox.appendChild(createRow()));
+            }
+            rowBox.style.transform = `translateY(${first * rowHeight}px)`;
+            for (let i = 0; i < rows.length; i++) {
+                fillRow(rows[i], i < count ? shown.get(first + i) : null);
+            }
+        }
+        
+        function createRow() {
+            const row = document.createElement('div');
+            row.className = 'data-line';
+            row.appendChild(document.createElement('span')).className = 'timestamp';
+            row.appendChild(document.createTextNode(''));
+            row.item = undefined;
+            return row;
+        }
+        
+        function measureRow() {
+            const row = rowBox.appendChild(createRow());
+            row.lastChild.data = 'distance: 0 mm';
+            const height = row.offsetHeight + parseFloat(getComputedStyle(row).marginBottom);
+            rowBox.removeChild(row);
+            return height || 1;
+        }
+        
+        function fillRow(row, data) {
+            // Rows are only rewritten when they show a different reading
+            if (row.item === data && row.showTimestamps === showTimestamps) {
+                return;
+            }
+            row.item = data;
+            row.showTimestamps = showTimestamps;
+            row.style.display = data ? '' : 'none';
+            if (!data) {
+                return;
+            }
+            if (data.time === undefined) {
+                data.time = new Date(data.timestamp).toLocaleTimeString();
+            }
+            row.firstChild.textContent = showTimestamps ? `[${data.time}]` : '';
+            row.lastChild.data = data.message;
+        }
+        
+        function refilter() {
+            shown.clear();
+            for (let i = 0; i < allData.length; i++) {
+                const data = allData.get(i);
+                if (shouldShowMessage(data.message)) {
+                    shown.push(data);
                 }
             }
+            requestFrame();
+        }
+        
+        // --- Distance Chart ---
+        // A strip chart of the last CHART_SECONDS of readings over the zone
+        // bands. Samples go into typed-array rings (no object per sample) and
+        // each frame only the newly exposed strip is drawn: the old image is
+        // shifted left by whole pixels and the line continued from the last
+        // sample drawn. Everything is in device pixels.
+        const CHART_CAPACITY = 8192;  // samples kept; a power of two, 30 s at ~270 Hz
+        const CHART_GAP_MS = 1000;    // a longer silence breaks the line
+        const chart = document.getElementById('distance-chart');
+        const chartContext = chart.getContext('2d');
+        const chartSeconds = Number(chart.dataset.seconds);
+        const chartMaxMm = Number(chart.dataset.maxMm);
+        const chartBands = [  // [from mm, to mm, colour]
+            [0, Number(chart.dataset.dangerMm), 'rgba(231, 76, 60, 0.25)'],
+            [Number(chart.dataset.dangerMm), Number(chart.dataset.warningMm), 'rgba(243, 156, 18, 0.2)'],
+            [Number(chart.dataset.warningMm), chartMaxMm, 'rgba(39, 174, 96, 0.15)']
+        ];
+        const chartTimes = new Float64Array(CHART_CAPACITY);      // Unix ms
+        const chartDistances = new Float32Array(CHART_CAPACITY);  // mm, NaN for ERROR
+        let chartHead = 0;
+        let chartCount = 0;
+        let chartEdge = null;       // time at the right edge of the image
+        let chartLastDrawn = null;  // time of the newest sample in the image
+        let chartResized = true;
+        
+        window.addEventListener('resize', function() {
+            chartResized = true;
+            requestFrame();
+        });
+        
+        function chartPush(time, distance) {
+            chartTimes[chartHead] = time;
+            chartDistances[chartHead] = distance;
+            chartHead = (chartHead + 1) & (CHART_CAPACITY - 1);
+            if (chartCount < CHART_CAPACITY) {
+                chartCount++;
+            }
+        }
+        
+        function drawChart() {
+            if (chartCount === 0) {
+                return;
+            }
+            const newest = chartTimes[(chartHead - 1) & (CHART_CAPACITY - 1)];
+            if (chartResized) {
+                chart.width = Math.round(chart.clientWidth * window.devicePixelRatio);
+                chart.height = Math.round(chart.clientHeight * window.devicePixelRatio);
+                chartResized = false;
+                chartEdge = null;
+            }
+            const msPerPixel = chartSeconds * 1000 / chart.width;
+            if (chartEdge === null || newest < chartEdge || newest - chartEdge >= chartSeconds * 1000) {
+                // First draw, resize, a long gap or a clock step: redraw everything
+                chartEdge = newest;
+                chartLastDrawn = null;
+                drawChartStrip(0);
+                return;
+            }
+            const shift = Math.floor((newest - chartEdge) / msPerPixel);
+            if (shift === 0) {
+                return;  // nothing new a whole pixel wide yet
+            }
+            chartContext.drawImage(chart, -shift, 0);
+            chartEdge += shift * msPerPixel;
+            // Redraw from the newest sample already in the image, so the line continues from it
+            const from = chartLastDrawn === null ? chart.width - shift
+                : Math.floor(chart.width - (chartEdge - chartLastDrawn) / msPerPixel) - 2;
+            drawChartStrip(Math.max(0, Math.min(from, chart.width - shift)));
+        }
+        
+        function drawChartStrip(left) {
+            const width = chart.width;
+            const height = chart.height;
+            const msPerPixel = chartSeconds * 1000 / width;
+            const mmPerPixel = chartMaxMm / height;
+            const fromTime = chartEdge - (width - left) * msPerPixel;
+            const context = chartContext;
             
-            // Update connection status
-            if (data.status) {
-                updateConnectionStatus(data.status);
+            context.save();
+            context.beginPath();
+            context.rect(left, 0, width - left, height);
+            context.clip();
+            context.clearRect(left, 0, width - left, height);
+            for (const [low, high, colour] of chartBands) {
+                context.fillStyle = colour;
+                context.fillRect(left, height - high / mmPerPixel, width - left, (high - low) / mmPerPixel);
+            }
+            
+            // Start one sample before the strip so the first segment enters it
+            let index = (chartHead - 1) & (CHART_CAPACITY - 1);
+            let remaining = chartCount - 1;
+            while (remaining > 0 && chartTimes[index] >= fromTime) {
+                index = (index - 1) & (CHART_CAPACITY - 1);
+                remaining--;
+            }
+            context.beginPath();
+            let previous = -Infinity;
+            let penDown = false;
+            for (let n = remaining; n < chartCount; n++, index = (index + 1) & (CHART_CAPACITY - 1)) {
+                const time = chartTimes[index];
+                if (time > chartEdge) {
+                    break;  // less than a pixel old: drawn with the next shift
+                }
+                const distance = chartDistances[index];
+                if (distance !== distance) {  // NaN: an ERROR reading breaks the line
+                    penDown = false;
+                } else {
+                    const x = width - (chartEdge - time) / msPerPixel;
+                    const y = height - Math.min(distance, chartMaxMm) / mmPerPixel;
+                    if (penDown && time - previous <= CHART_GAP_MS) {
+                        context.lineTo(x, y);
+                    } else {
+                        context.moveTo(x, y);
+                    }
+                    penDown = true;
+                }
+                previous = time;
+                chartLastDrawn = time;
             }
+            context.strokeStyle = getComputedStyle(chart).color;
+            context.lineWidth = 1.5 * window.devicePixelRatio;
+            context.lineJoin = 'round';
+            context.stroke();
+            context.restore();
         }
         
         function updateConnectionStatus(status) {
@@ -650,6 +792,9 @@ HTML_PAGE = """
         }
         
         function updateStatistics(data) {
+            if (data.zone) {
+                updateZone(data.zone);
+            }
             if (data.stats) {
                 document.getElementById('message-count').textContent = data.stats.message_count || 0;
                 document.getElementById('bytes-count').textContent = formatBytes(data.stats.total_bytes || 0);
@@ -659,12 +804,31 @@ HTML_PAGE = """
                 const dataRate = formatBytes(data.stats.data_rate || 0) + '/s';
                 document.getElementById('data-rate').textContent = dataRate;
                 document.getElementById('data-rate-display').textContent = dataRate;
-                
+                updateLinkErrors(data.stats);
+            }
+            if (data.timestamp) {
                 document.getElementById('last-message').textContent = 
                     new Date(data.timestamp).toLocaleTimeString();
             }
         }
         
+        function updateLinkErrors(stats) {
+            const element = document.getElementById('link-missing');
+            element.textContent = stats.missing || 0;
+            element.title = `${stats.gaps || 0} gaps, ${stats.duplicates || 0} duplicates, ` +
+                `${stats.late || 0} late, ${stats.restarts || 0} restarts, ${stats.corrupt || 0} corrupt lines`;
+        }
+        
+        function updateZone(zone) {
+            const zoneElement = document.getElementById('zone-status');
+            zoneElement.textContent = zone.toUpperCase();
+            zoneElement.className = 'status-value zone-' + zone;
+        }
+        
+        function selectSensor(id) {
+            window.location.search = '?sensor=' + encodeURIComponent(id);
+        }
+        
         function formatBytes(bytes) {
             if (bytes === 0) return '0 B';
             const k = 1024;
@@ -679,6 +843,9 @@ HTML_PAGE = """
         }
         
         function clearDisplay() {
+            shown.clear();
+            spacer = null;
+            rows = [];
             document.getElementById('data-display').innerHTML = 
                 '<div class="no-data-message"><i class="loading-spinner"></i> Display cleared...</div>';
         }
@@ -689,6 +856,7 @@ HTML_PAGE = """
         
         function toggleTimestamps() {
             showTimestamps = document.getElementById('timestamps').checked;
+            requestFrame();
         }
         
         function toggleSoundAlerts() {
@@ -716,15 +884,17 @@ HTML_PAGE = """
         
         function applyFilter() {
             filterText = document.getElementById('filter-text').value;
+            refilter();
         }
         
         function clearFilter() {
             document.getElementById('filter-text').value = '';
             filterText = '';
+            refilter();
         }
         
         function downloadData() {
-            const data = allData.map(item => 
+            const data = allData.toArray().map(item => 
                 `"${item.timestamp}","${item.message.replace(/"/g, '""')}"`
             ).join('\\n');
             
@@ -755,6 +925,22 @@ HTML_PAGE = """
                 .catch(error => console.log('Logging toggle error:', error));
         }
         
+        function toggleRecording() {
+            fetch('/toggle_recording', { method: 'POST' })
+                .then(response => response.json())
+                .then(data => {
+                    const btn = document.getElementById('rec-btn');
+                    if (data.recording) {
+                        btn.innerHTML = '<i class="fas fa-stop"></i> Stop Recording';
+                        btn.className = 'btn btn-danger';
+                    } else {
+                        btn.innerHTML = '<i class="fas fa-circle"></i> Start Recording';
+                        btn.className = 'btn btn-warning';
+                    }
+                })
+                .catch(error => console.log('Recording toggle error:', error));
+        }
+        
         // Update uptime every second
         setInterval(() => {
             const uptime = Math.floor((new Date() - startTime) / 1000);
@@ -763,179 +949,169 @@ HTML_PAGE = """
             const seconds = (uptime % 60).toString().padStart(2, '0');
             document.getElementById('uptime').textContent = `${hours}:${minutes}:${seconds}`;
         }, 1000);
-    </script>
-</body>
-</html>
 """
 
-@app.route("/")
-def index():
-    try:
-        return render_template_string(HTML_PAGE, port=SERIAL_PORT, baudrate=SERIAL_BAUDRATE)
-    except Exception as e:
-        print(f"[ERROR] Template error: {e}")
-        return f"<h1>Error</h1><p>{e}</p>", 500
-
-@app.route("/stream")
-def stream():
-    print("[DEBUG] Stream route accessed")
-    
-    def event_stream():
-        print("[DEBUG] Event stream generator started")
-        global message_count, total_bytes, start_time
-        last_time = time.time()
-        last_message_count = 0
-        last_bytes = 0
-        
-        while True:
-            try:
-                current_time = time.time()
-                time_diff = current_time - last_time
-                
-                # Calculate rates every second
-                message_rate = 0
-                data_rate = 0
-                if time_diff >= 1.0:
-                    message_rate = (message_count - last_message_count) / time_diff
-                    data_rate = (total_bytes - last_bytes) / time_diff
-                    last_message_count = message_count
-                    last_bytes = total_bytes
-                    last_time = current_time
-                
-                # Calculate average message size
-                avg_msg_size = total_bytes / max(message_count, 1)
-                
-                data = {
-                    "message": latest_data,
-                    "timestamp": datetime.now().isoformat(),
-                    "status": connection_status,
-                    "stats": {
-                        "message_count": message_count,
-                        "total_bytes": total_bytes,
-                        "avg_message_size": avg_msg_size,
-                        "message_rate": message_rate,
-                        "data_rate": data_rate
-                    }
-                }
-                
-                json_str = json.dumps(data)
-                yield f"data: {json_str}\n\n"
-                time.sleep(0.2)  # Send updates every 200ms
-                
-            except Exception as e:
-                print(f"[ERROR] Stream error: {e}")
-                error_data = json.dumps({"error": str(e), "timestamp": datetime.now().isoformat()})
-                yield f"data: {error_data}\n\n"
-                time.sleep(1)
-    
-    response = Response(event_stream(), mimetype="text/event-stream")
-    response.headers['Cache-Control'] = 'no-cache'
-    response.headers['Access-Control-Allow-Origin'] = '*'
-    return response
-
-@app.route("/toggle_logging", methods=["POST"])
-def toggle_logging():
-    global data_logging, log_filename
+HTML_PAGE = """
+<!DOCTYPE html>
+<html>
+<head>
+    <title>Dynamic Serial Monitor Pro</title>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <link rel="stylesheet" href="{{ css_url }}">
+</head>
+<body data-sensor="{{ sensor }}">
+    <div class="header">
+        <h1><i class="fas fa-satellite-dish"></i> Dynamic Serial Monitor Pro</h1>
+    </div>
     
-    try:
-        data_logging = not data_logging
-        
-        if data_logging:
-            log_filename = f"serial_log_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-            with open(log_filename, 'w', newline='') as f:
-                writer = csv.writer(f)
-                writer.writerow(['Timestamp', 'Data'])
-            print(f"[INFO] Started logging to {log_filename}")
-        else:
-            print(f"[INFO] Stopped logging")
-        
-        return jsonify({"logging": data_logging, "filename": log_filename})
+    <div class="status-grid">
+        <div class="status-card">
+            <span class="status-value" id="connection-status">
+                <span class="connection-indicator disconnected"></span>Disconnected
+            </span>
+            <span class="status-label">Connection Status</span>
+        </div>
+        <div class="status-card">
+            <span class="status-value" id="port-info">{{port}}</span>
+            <span class="status-label">Port</span>
+        </div>
+        <div class="status-card">
+            <span class="status-value" id="baudrate-info">{{baudrate}}</span>
+            <span class="status-label">Baud Rate</span>
+        </div>
+        <div class="status-card">
+            <span class="status-value" id="message-count">0</span>
+            <span class="status-label">Messages</span>
+        </div>
+        <div class="status-card">
+            <span class="status-value" id="bytes-count">0 B</span>
+            <span class="status-label">Total Bytes</span>
+        </div>
+        <div class="status-card">
+            <span class="status-value" id="uptime">00:00:00</span>
+            <span class="status-label">Uptime</span>
+        </div>
+        <div class="status-card">
+            <span class="status-value" id="zone-status">--</span>
+            <span class="status-label">Proximity Zone</span>
+        </div>
+    </div>
     
-    except Exception as e:
-        print(f"[ERROR] Logging toggle failed: {e}")
-        return jsonify({"error": str(e)})
-
-# --- Serial Reader Thread ---
-def serial_reader():
-    global latest_data, connection_status, total_bytes, message_count, data_history
+    <div class="controls-section">
+        <div class="controls-grid">
+            <button class="btn btn-primary" onclick="clearDisplay()">
+                <i class="fas fa-trash"></i> Clear Display
+            </button>
+            <button class="btn btn-success" onclick="downloadData()">
+                <i class="fas fa-download"></i> Download Data
+            </button>
+            <button class="btn btn-warning" onclick="toggleLogging()" id="log-btn">
+                <i class="fas fa-file-alt"></i> Start Logging
+            </button>
+            <button class="btn btn-warning" onclick="toggleRecording()" id="rec-btn">
+                <i class="fas fa-circle"></i> Start Recording
+            </button>
+            {% if sensors|length > 1 %}
+            <select class="form-control" style="width: auto;" onchange="selectSensor(this.value)">
+                {% for sensor_id in sensors %}
+                <option value="{{sensor_id}}" {% if sensor_id == sensor %}selected{% endif %}>{{sensor_id}}</option>
+                {% endfor %}
+            </select>
+            {% endif %}
+            <label class="checkbox-wrapper">
+                <input type="checkbox" id="auto-scroll" checked onchange="toggleAutoScroll()">
+                <i class="fas fa-arrows-alt-v"></i>
+                <span>Auto Scroll</span>
+            </label>
+            <label class="checkbox-wrapper">
+                <input type="checkbox" id="timestamps" checked onchange="toggleTimestamps()">
+                <i class="fas fa-clock"></i>
+                <span>Show Timestamps</span>
+            </label>
+            <label class="checkbox-wrapper">
+                <input type="checkbox" id="sound-alerts" onchange="toggleSoundAlerts()">
+                <i class="fas fa-volume-up"></i>
+                <span>Sound Alerts</span>
+            </label>
+        </div>
+    </div>
     
-    while True:
-        try:
-            print(f"[INFO] Attempting to connect to {SERIAL_PORT}...")
-            ser = serial.Serial(SERIAL_PORT, SERIAL_BAUDRATE, timeout=0.1)
-            ser.dtr = False
-            ser.rts = False
-            connection_status = "Connected"
-            print(f"[INFO] Connected to {SERIAL_PORT} at {SERIAL_BAUDRATE} baud")
-            
-            while True:
-                if ser.in_waiting > 0:
-                    data_bytes = ser.read(ser.in_waiting)
-                    try:
-                        data_str = data_bytes.decode('utf-8').strip()
-                    except UnicodeDecodeError:
-                        data_str = f"<BIN:{data_bytes.hex()}>"
-                    
-                    if data_str:
-                        latest_data = data_str
-                        total_bytes += len(data_bytes)
-                        message_count += 1
-                        
-                        # Store in history
-                        timestamp = datetime.now()
-                        data_history.append({
-                            'timestamp': timestamp,
-                            'data': data_str,
-                            'bytes': len(data_bytes)
-                        })
-                        
-                        # Log to file if enabled
-                        if data_logging and log_filename:
-                            try:
-                                with open(log_filename, 'a', newline='') as f:
-                                    writer = csv.writer(f)
-                                    writer.writerow([timestamp.isoformat(), data_str])
-                            except Exception as e:
-                                print(f"[ERROR] Logging failed: {e}")
-                        
-                        print(f"[SERIAL] {data_str}")
-                
-                time.sleep(0.05)
-                
-        except serial.SerialException as e:
-            print(f"[ERROR] Serial connection failed: {e}")
-            connection_status = f"Serial Error: {str(e)}"
-            latest_data = "Serial connection error"
-            time.sleep(3)
+    <div class="main-layout">
+        <div class="data-panel">
+            <div class="panel-header">
+                <i class="fas fa-chart-line"></i>
+                <span class="panel-title">Distance</span>
+                <span class="data-rate">last {{ chart_seconds }} s, 0 to {{ chart_max_mm }} mm</span>
+            </div>
+            <canvas class="distance-chart" id="distance-chart" data-seconds="{{ chart_seconds }}" data-max-mm="{{ chart_max_mm }}"
+                    data-danger-mm="{{ danger_mm }}" data-warning-mm="{{ warning_mm }}"></canvas>
+            <div class="panel-header">
+                <i class="fas fa-stream"></i>
+                <span class="panel-title">Live Serial Data Stream</span>
+                <span class="data-rate" id="data-rate-display">0 B/s</span>
+            </div>
+            <div class="data-display" id="data-display">
+                <div class="no-data-message">
+                    <i class="loading-spinner"></i> Waiting for data...
+                </div>
+            </div>
+        </div>
+        
+        <div class="sidebar">
+            <div class="stats-panel">
+                <div class="panel-header">
+                    <i class="fas fa-chart-bar"></i>
+                    <span class="panel-title">Live Statistics</span>
+                </div>
+                <div class="stats-grid">
+                    <div class="stat-item">
+                        <span class="stat-value" id="avg-msg-size">0 B</span>
+                        <span class="stat-label">Avg Message Size</span>
+                    </div>
+                    <div class="stat-item">
+                        <span class="stat-value" id="msg-rate">0.0/s</span>
+                        <span class="stat-label">Messages/sec</span>
+                    </div>
+                    <div class="stat-item">
+                        <span class="stat-value" id="data-rate">0 B/s</span>
+                        <span class="stat-label">Data Rate</span>
+                    </div>
+                    <div class="stat-item">
+                        <span class="stat-value" id="link-missing" title="No gaps">0</span>
+                        <span class="stat-label">Lost Readings</span>
+                    </div>
+                    <div class="stat-item">
+                        <span class="stat-value" id="last-message">1:14:03 PM</span>
+                        <span class="stat-label">Last Message</span>
+                    </div>
+                </div>
+            </div>
             
-        except Exception as e:
-            print(f"[ERROR] Unexpected serial error: {e}")
-            connection_status = f"Error: {str(e)}"
-            time.sleep(3)
+            <div class="filter-panel">
+                <div class="panel-header">
+                    <i class="fas fa-filter"></i>
+                    <span class="panel-title">Data Filter</span>
+                </div>
+                <div class="filter-content">
+                    <div class="input-group">
+                        <label><i class="fas fa-search"></i> Filter Text</label>
+                        <input type="text" class="form-control" id="filter-text" 
+                               placeholder="Enter text to filter..." 
+                               onkeyup="applyFilter()">
+                    </div>
+                    <button class="btn btn-danger" onclick="clearFilter()" style="width: 100%;">
+                        <i class="fas fa-times"></i> Clear Filter
+                    </button>
+                </div>
+            </div>
+        </div>
+    </div>
+
+    <script src="{{ js_url }}"></script>
+</body>
+</html>
+"""
 
 if __name__ == "__main__":
-    try:
-        print(f"[INFO] Dynamic Serial Monitor Pro Starting...")
-        print(f"[INFO] Configuration: {SERIAL_PORT} @ {SERIAL_BAUDRATE} baud")
-        
-        # Start the serial reader thread
-        print(f"[INFO] Starting serial reader thread...")
-        threading.Thread(target=serial_reader, daemon=True).start()
-        time.sleep(1)  # Give serial thread time to start
-        
-        print(f"[INFO] Starting Flask web server...")
-        print(f"[INFO] 🌐 Access dashboard at: http://localhost:5000")
-        print(f"[INFO] 🌐 Or from network: http://10.157.212.51:5000")
-        print(f"[INFO] Press Ctrl+C to stop")
-        
-        # Run Flask
-        app.run(host="0.0.0.0", port=5000, debug=False, threaded=True, use_reloader=False)
-        
-    except KeyboardInterrupt:
-        print(f"\\n[INFO] Server stopped by user")
-    except Exception as e:
-        print(f"[ERROR] Application failed: {e}")
-        import traceback
-        traceback.print_exc()
-    finally:
-        print(f"[INFO] Application ended")
\ No newline at end of file
+    run_dashboard(HTML_PAGE, DASHBOARD_CSS, DASHBOARD_JS, "Dynamic Serial Monitor Pro")